@@ -3,14 +3,16 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 from django.contrib.auth.models import Group
+from django.db.models import Count
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import format_html
-from django.db.models import Count
 
 from eval.models import ReconstructionEntry
 
+from .exports import USER_FIELDS, export_actions
 from .forms import UserCreationForm
-from .models import User
+from .models import EmailStatus, OutboxEmail, User
 
 
 class UserChangeForm(forms.ModelForm):
@@ -68,9 +70,15 @@ class UserAdmin(BaseUserAdmin):
     search_fields = ("email", "university")
     ordering = ("email",)
     filter_horizontal = ()
+    actions = export_actions(USER_FIELDS, "users")
 
     def num_entries(self, obj):
-        return obj.num_entries
+        return format_html(
+            '<a href="{}?creator={}">{}</a>',
+            reverse("admin:eval_reconstructionentry_changelist"),
+            obj.pk,
+            obj.num_entries,
+        )
 
     num_entries.admin_order_field = "num_entries"
     num_entries.short_description = "Number of entries"
@@ -101,6 +109,26 @@ class UserAdmin(BaseUserAdmin):
         return format_html(", ".join(entries_list))
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "to", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("subject", "to")
+    ordering = ("-created_at",)
+    readonly_fields = [f.name for f in OutboxEmail._meta.fields]
+    actions = ["retry_action"]
+
+    @admin.action(description="Retry sending selected emails")
+    def retry_action(self, request, queryset):
+        retried = queryset.exclude(status=EmailStatus.SENT).update(
+            status=EmailStatus.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Queued {retried} emails to be sent again.")
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(User, UserAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
 
 admin.site.unregister(Group)
@@ -0,0 +1,142 @@
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from eval import cache as entries_cache
+from eval.cache import bump_entries_version
+from eval.models import EntryStatus, EntryVisibility, ReconstructionEntry
+
+User = get_user_model()
+
+
+def benchmark_settings(**kwargs):
+    """Settings to render pages with as in production, but without requiring
+    collectstatic to have been run for hashed static file names, and without
+    rate limits."""
+    return override_settings(
+        DEBUG=False,
+        RATE_LIMITS_ENABLED=False,
+        STORAGES={
+            **settings.STORAGES,
+            "staticfiles": {
+                "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+            },
+        },
+        **kwargs,
+    )
+
+
+@contextmanager
+def scratch_database(path=None):
+    """Points all connection aliases at the SQLite database at `path`, or at one in a
+    temporary directory, migrating it first, and back at the configured database
+    afterwards. As in DATABASE_DIR, cached entry ids are versioned by the
+    `entries.version` file next to the database. Yields the path of the database."""
+    with ExitStack() as stack:
+        if path is None:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            path = Path(directory) / "db.sqlite3"
+        path = Path(path)
+
+        connections.close_all()
+        names = {
+            alias: connections[alias].settings_dict["NAME"] for alias in connections
+        }
+        version_file = entries_cache.VERSION_FILE
+        for alias in connections:
+            connections[alias].settings_dict["NAME"] = path
+        entries_cache.VERSION_FILE = path.parent / "entries.version"
+        # Content type ids differ between databases
+        ContentType.objects.clear_cache()
+        try:
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            bump_entries_version()
+            yield path
+        finally:
+            connections.close_all()
+            for alias, name in names.items():
+                connections[alias].settings_dict["NAME"] = name
+            # The caches of this process are dropped as the version differs
+            entries_cache.VERSION_FILE = version_file
+            ContentType.objects.clear_cache()
+
+
+def seed_entries(num_entries):
+    """Commits a user with the given number of successful entries, half of which
+    are public. Deleting the user deletes them too."""
+    user = User.objects.create_user(
+        email=f"bench-{uuid.uuid4().hex[:8]}@test.test",
+        university="University of Benchmarks",
+        is_active=True,
+        is_verified=True,
+    )
+    ReconstructionEntry.objects.bulk_create(
+        ReconstructionEntry(
+            creator=user,
+            name=f"bench {i}",
+            pub_date=timezone.now(),
+            visibility=EntryVisibility.PUBL if i % 2 else EntryVisibility.PRIV,
+            process_status=EntryStatus.SUCCESS,
+            psnr_mean=20 + i % 17,
+            ssim_mean=0.5,
+            lpips_mean=0.5,
+        )
+        for i in range(num_entries)
+    )
+    bump_entries_version()
+    return user, list(ReconstructionEntry.objects.filter(creator=user).order_by("pk"))
+
+
+class EvaluatorWrites(threading.Thread):
+    """Mimics the evaluator, repeatedly holding the database write lock while
+    updating an entry, with short pauses in between."""
+
+    def __init__(self, pk, hold, pause):
+        super().__init__(daemon=True)
+        self.pk, self.hold, self.pause = pk, hold, pause
+        self.stopped = threading.Event()
+        self.writes = 0
+        # Time spent per write apart from holding the lock, i.e. waiting for it
+        self.latencies = []
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                with transaction.atomic():
+                    # A queryset update, such that caches aren't invalidated
+                    ReconstructionEntry.objects.filter(pk=self.pk).update(
+                        psnr_mean=self.writes % 40
+                    )
+                    time.sleep(self.hold)
+                self.latencies.append(time.perf_counter() - start - self.hold)
+                self.writes += 1
+                time.sleep(self.pause)
+        finally:
+            connections.close_all()
+
+
+def percentiles(latencies, qs=(50, 95, 99)):
+    """Returns the given percentiles of the latencies, in milliseconds."""
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return [quantiles[q - 1] * 1000 for q in qs]
+
+
+def format_latencies(latencies):
+    p50, p95, p99 = percentiles(latencies)
+    return (
+        f"p50 {p50:6.1f}ms  p95 {p95:6.1f}ms  p99 {p99:6.1f}ms  "
+        f"max {max(latencies) * 1000:6.1f}ms"
+    )
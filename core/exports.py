@@ -0,0 +1,130 @@
+import csv
+import json
+import sys
+from abc import ABC, abstractmethod
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from eval.models import ReconstructionEntry
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+USER_FIELDS = [
+    "id",
+    "email",
+    "university",
+    "website",
+    "is_active",
+    "is_verified",
+    "is_superuser",
+    "last_login",
+]
+
+ENTRY_FIELDS = [
+    "id",
+    "uuid",
+    "name",
+    "creator_id",
+    "creator__email",
+    "pub_date",
+    "visibility",
+    "process_status",
+    "is_active",
+    "citation",
+    "code_url",
+] + [m.name for m in ReconstructionEntry.metric_fields]
+
+
+class Echo:
+    """An object that implements just the write method of the file-like
+    interface, used to stream rows out of a csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(queryset, fields, format="csv"):
+    """Yields the given fields of every row of the queryset as lines of CSV (with a
+    header) or NDJSON. Rows are fetched `CHUNK_SIZE` at a time as tuples, so memory
+    use doesn't depend on the number of rows."""
+    rows = queryset.order_by("pk").values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+    if format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def export_response(queryset, fields, format, filename):
+    response = StreamingHttpResponse(
+        export_lines(queryset, fields, format), content_type=FORMATS[format]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    return response
+
+
+def export_actions(fields, filename):
+    """Admin actions which download the selected rows as CSV or NDJSON."""
+
+    def make_action(format):
+        def action(modeladmin, request, queryset):
+            return export_response(queryset, fields, format, filename)
+
+        action.__name__ = f"export_{format}"
+        action.short_description = f"Export selected as {format.upper()}"
+        return action
+
+    return [make_action(format) for format in FORMATS]
+
+
+def write_export(file, queryset, fields, format):
+    """Writes an export to an open file, returns the number of rows written."""
+    lines = 0
+    for line in export_lines(queryset, fields, format):
+        file.write(line)
+        lines += 1
+    # Not counting the header
+    return lines - 1 if format == "csv" else lines
+
+
+class ExportCommand(ABC, BaseCommand):
+    """Base for commands which export the `fields` of a queryset, see `get_queryset`."""
+
+    fields = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=list(FORMATS), default="csv", help="Output format"
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Path to the output file (default: stdout)",
+        )
+
+    @abstractmethod
+    def get_queryset(self, **options):
+        """Returns the queryset to export, given the options of the command."""
+
+    def handle(self, *args, **options):
+        queryset = self.get_queryset(**options)
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                count = write_export(f, queryset, self.fields, options["format"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Exported {count} rows to {options['output']}")
+            )
+        else:
+            write_export(sys.stdout, queryset, self.fields, options["format"])
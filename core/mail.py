@@ -0,0 +1,169 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailStatus, OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def dedup_key(message):
+    recipients = ",".join(sorted(message.recipients()))
+    key = f"{message.from_email}\n{recipients}\n{message.subject}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def enqueue(message):
+    """Stores an email in the outbox, or replaces a duplicate that is still pending.
+    Returns false if a duplicate was already sent, in which case it is dropped."""
+    if message.attachments:
+        raise ValueError("Emails with attachments can't be queued in the outbox.")
+
+    fields = {
+        "from_email": message.from_email,
+        "to": message.to,
+        "cc": message.cc,
+        "bcc": message.bcc,
+        "reply_to": message.reply_to,
+        "subject": message.subject,
+        "body": message.body,
+        "alternatives": [list(alt) for alt in getattr(message, "alternatives", [])],
+        "headers": message.extra_headers,
+    }
+    key = dedup_key(message)
+    now = timezone.now()
+    since = now - timezone.timedelta(seconds=settings.OUTBOX_DEDUP_SECONDS)
+
+    with transaction.atomic():
+        duplicate = (
+            OutboxEmail.objects.filter(
+                dedup_key=key,
+                created_at__gte=since,
+                status__in=[EmailStatus.PENDING, EmailStatus.SENT],
+            )
+            .order_by("-created_at")
+            .only("status")
+            .first()
+        )
+        if duplicate is None:
+            OutboxEmail.objects.create(dedup_key=key, created_at=now, **fields)
+        elif duplicate.status == EmailStatus.PENDING:
+            # Keep the newest content, e.g. the latest confirmation token
+            OutboxEmail.objects.filter(pk=duplicate.pk).update(
+                version=F("version") + 1, **fields
+            )
+        else:
+            logger.info(
+                "Dropped duplicate of email #%s: %s", duplicate.pk, message.subject
+            )
+            return False
+    return True
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Queues emails in the database instead of sending them, so that e.g. a signup
+    doesn't wait on the mail provider. They are sent by `manage.py send_outbox`
+    through OUTBOX_EMAIL_BACKEND."""
+
+    def send_messages(self, email_messages):
+        queued = 0
+        for message in email_messages:
+            try:
+                queued += enqueue(message)
+            except Exception:
+                if not self.fail_silently:
+                    raise
+        return queued
+
+
+def build_message(email, connection=None):
+    return EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        alternatives=[tuple(alt) for alt in email.alternatives],
+        connection=connection,
+    )
+
+
+def retry_delay(attempts):
+    return timezone.timedelta(
+        seconds=settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1)
+    )
+
+
+def send_batch(batch_size):
+    """Sends the pending emails that are due, at most `batch_size` of them, over a
+    single connection. Failed emails are retried later with an exponential backoff,
+    until they run out of attempts. Returns the number of sent and failed emails."""
+    batch = list(
+        OutboxEmail.objects.filter(
+            status=EmailStatus.PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at")[:batch_size]
+    )
+    if not batch:
+        return 0, 0
+
+    errors = {}
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        with connection:
+            for email in batch:
+                try:
+                    connection.send_messages([build_message(email, connection)])
+                except Exception as e:
+                    errors[email.pk] = e
+                else:
+                    errors[email.pk] = None
+    except Exception as e:
+        # The connection could not be opened (or closed), nothing else was sent
+        for email in batch:
+            errors.setdefault(email.pk, e)
+
+    now = timezone.now()
+    sent = failed = 0
+    for email in batch:
+        error = errors[email.pk]
+        if error is None:
+            email.status = EmailStatus.SENT
+            email.sent_at = now
+            sent += 1
+            continue
+
+        email.attempts += 1
+        email.last_error = f"{type(error).__name__}: {error}"
+        if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            email.status = EmailStatus.FAILED
+            logger.error("Giving up on email #%s: %s", email.pk, email.last_error)
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+            logger.warning("Failed to send email #%s: %s", email.pk, email.last_error)
+        failed += 1
+
+    # Only the delivery fields, and only of emails whose content wasn't replaced by
+    # `enqueue` while they were sent. Those stay pending to send the new content.
+    with transaction.atomic():
+        for email in batch:
+            updated = OutboxEmail.objects.filter(
+                pk=email.pk, version=email.version
+            ).update(
+                status=email.status,
+                attempts=email.attempts,
+                last_error=email.last_error,
+                next_attempt_at=email.next_attempt_at,
+                sent_at=email.sent_at,
+            )
+            if not updated:
+                logger.info("Email #%s was replaced while sending it", email.pk)
+    return sent, failed
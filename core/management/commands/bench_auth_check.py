@@ -0,0 +1,84 @@
+import logging
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from core.benchmarks import scratch_database
+from core.media import sign_media_path
+from eval.constants import MEDIA_DIRECTORY
+from eval.models import EntryStatus, EntryVisibility, ReconstructionEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the media auth check (auth checks per second) with plain and signed
+    media urls, through the full middleware stack, against a temporary database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Number of requests per case"
+        )
+
+    def bench(self, client, url, num_requests):
+        for _ in range(num_requests // 10):
+            client.get(url)
+
+        start = time.perf_counter()
+        for _ in range(num_requests):
+            response = client.get(url)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+        return num_requests / elapsed
+
+    def handle(self, *args, **options):
+        # Don't flood the output with per-request query stats
+        logging.getLogger("core.middleware").setLevel(logging.WARNING)
+
+        with override_settings(DEBUG=False), scratch_database():
+            user = User.objects.create_user(
+                email=f"bench-{uuid.uuid4().hex[:8]}@test.test",
+                university="University of Benchmarks",
+                is_active=True,
+                is_verified=True,
+            )
+            entries = {
+                visibility: ReconstructionEntry.objects.create(
+                    creator=user,
+                    name="bench",
+                    pub_date=timezone.now(),
+                    visibility=visibility,
+                    process_status=EntryStatus.SUCCESS,
+                )
+                for visibility in (EntryVisibility.PUBL, EntryVisibility.PRIV)
+            }
+            anonymous, logged_in = (
+                Client(HTTP_HOST="localhost"),
+                Client(HTTP_HOST="localhost"),
+            )
+            logged_in.force_login(user)
+
+            cases = [
+                ("anonymous", anonymous, entries[EntryVisibility.PUBL]),
+                ("logged in", logged_in, entries[EntryVisibility.PRIV]),
+            ]
+            for persona, client, entry in cases:
+                path = str(
+                    (entry.sample_directory / "scene" / "000000.png").relative_to(
+                        MEDIA_DIRECTORY
+                    )
+                )
+                plain = self.bench(client, f"/auth/check/{path}", options["requests"])
+                signed = self.bench(
+                    client, f"/auth/check/{sign_media_path(path)}", options["requests"]
+                )
+                self.stdout.write(
+                    f"{persona:>10}: {plain:8.0f} checks/s unsigned, "
+                    f"{signed:8.0f} checks/s signed ({signed / plain:.1f}x)"
+                )
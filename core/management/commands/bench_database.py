@@ -0,0 +1,160 @@
+import copy
+import logging
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.urls import reverse
+
+from core.benchmarks import (
+    EvaluatorWrites,
+    benchmark_settings,
+    format_latencies,
+    scratch_database,
+    seed_entries,
+)
+
+# The database configuration before connections were tuned: a new connection per
+# request, and all queries on the default connection
+BASELINE = {
+    "CONN_MAX_AGE": 0,
+    "CONN_HEALTH_CHECKS": False,
+    "OPTIONS": {
+        "init_command": "PRAGMA journal_mode=wal;",
+        "transaction_mode": "IMMEDIATE",
+    },
+}
+
+
+def read_pages(client, pages, deadline, results):
+    """Requests random pages in a loop until the deadline, then sends their latency
+    per page to the results queue. Runs in its own process, like a gunicorn worker."""
+    latencies = {name: [] for name in pages}
+    try:
+        while time.perf_counter() < deadline:
+            name = random.choice(list(pages))
+            start = time.perf_counter()
+            response = client.get(pages[name]())
+            if response.streaming:
+                b"".join(response.streaming_content)
+            latencies[name].append(time.perf_counter() - start)
+            assert response.status_code == 200, (name, response.status_code)
+    finally:
+        connections.close_all()
+        results.put(latencies)
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark page reads by concurrent clients, each in its own process, while a
+    thread keeps taking the database write lock like the evaluator does. Runs with
+    the baseline database setup (a connection per request, default PRAGMAs, no
+    read-only routing) and with the configured one, against a temporary database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run each setup for"
+        )
+        parser.add_argument(
+            "--readers", type=int, default=4, help="Number of concurrent clients"
+        )
+        parser.add_argument(
+            "--entries", type=int, default=500, help="Number of leaderboard entries"
+        )
+        parser.add_argument(
+            "--hold", type=float, default=0.02, help="Seconds the write lock is held"
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.02, help="Seconds between writes"
+        )
+
+    @contextmanager
+    def database_setup(self, name):
+        connections.close_all()
+        if name == "configured":
+            yield
+            return
+
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        configured = copy.deepcopy(default)
+        default.update(copy.deepcopy(BASELINE))
+        try:
+            with benchmark_settings(DATABASE_ROUTERS=[]):
+                yield
+        finally:
+            connections.close_all()
+            default.clear()
+            default.update(configured)
+
+    def handle(self, *args, **options):
+        # Don't flood the output with per-request query stats
+        logging.getLogger("core.middleware").setLevel(logging.WARNING)
+
+        with scratch_database():
+            user, entries = seed_entries(options["entries"])
+            public = [entry.pk for entry in entries if entry.visibility != "PRIV"]
+            pages = {
+                "leaderboard": lambda: reverse("eval:reconstruction"),
+                "api": lambda: reverse("eval:reconstruction-api") + "?limit=100",
+                "detail": lambda: reverse(
+                    "eval:detail", kwargs={"pk": random.choice(public)}
+                ),
+                "compare": lambda: reverse(
+                    "eval:compare",
+                    kwargs=dict(zip(["pk1", "pk2"], random.sample(public, 2))),
+                ),
+            }
+
+            # Readers inherit the database setup of this process, i.e. the scratch one
+            context = multiprocessing.get_context("fork")
+
+            for setup in ("baseline", "configured"):
+                with self.database_setup(setup), benchmark_settings():
+                    clients = [
+                        Client(HTTP_HOST="localhost") for _ in range(options["readers"])
+                    ]
+                    for client in clients[1::2]:
+                        client.force_login(user)
+
+                    # Don't share connections with the forked readers
+                    connections.close_all()
+                    deadline = time.perf_counter() + options["duration"]
+                    results = context.Queue()
+                    readers = [
+                        context.Process(
+                            target=read_pages, args=(client, pages, deadline, results)
+                        )
+                        for client in clients
+                    ]
+                    for reader in readers:
+                        reader.start()
+
+                    writer = EvaluatorWrites(
+                        entries[0].pk, options["hold"], options["pause"]
+                    )
+                    writer.start()
+                    latencies = [results.get() for _ in readers]
+                    for reader in readers:
+                        reader.join()
+                    writer.stopped.set()
+                    writer.join()
+
+                num_requests = sum(
+                    len(t) for result in latencies for t in result.values()
+                )
+                self.stdout.write(self.style.MIGRATE_HEADING(setup))
+                self.stdout.write(
+                    f"  {num_requests / options['duration']:.0f} pages/s with "
+                    f"{len(readers)} clients, {writer.writes} evaluator writes"
+                )
+                for name in pages:
+                    page = [t for result in latencies for t in result[name]]
+                    self.stdout.write(f"  {name:>12}: {format_latencies(page)}")
+                self.stdout.write(
+                    f"  {'write wait':>12}: {format_latencies(writer.latencies)}"
+                )
@@ -0,0 +1,233 @@
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.utils import get_random_secret_key
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.benchmarks import format_latencies, scratch_database, seed_entries
+
+# As started by .config/supervisord.conf and .config/supervisord.asgi.conf
+SERVERS = {
+    "wsgi (gunicorn, sync workers)": [
+        "gunicorn",
+        "--bind=127.0.0.1:{port}",
+        "--workers={workers}",
+        "spcwebsite.wsgi:application",
+    ],
+    "asgi (uvicorn)": [
+        "uvicorn",
+        "--host=127.0.0.1",
+        "--port={port}",
+        "--workers={workers}",
+        "--no-access-log",
+        "spcwebsite.asgi:application",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(process, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except ConnectionRefusedError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise CommandError(f"{process.args[2]} did not start, run it manually")
+            time.sleep(0.1)
+
+
+def get_pages(port, pages, deadline, latencies):
+    """Requests random pages, each on a new connection, until the deadline."""
+    while time.perf_counter() < deadline:
+        name = random.choice(list(pages))
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        start = time.perf_counter()
+        conn.request("GET", pages[name](), headers={"Host": "localhost"})
+        response = conn.getresponse()
+        response.read()
+        latencies[name].append(time.perf_counter() - start)
+        conn.close()
+        assert response.status == 200, (name, response.status)
+
+
+def slow_posts(port, path, size, duration, deadline, counts):
+    """Sends a form of `size` bytes in pieces over `duration` seconds, like a slow
+    client whose upload Caddy streams through, until the deadline."""
+    # Any 32 character string is a valid CSRF secret, the header must match the cookie
+    token = get_random_string(32)
+    head = (
+        f"POST {path} HTTP/1.1\r\n"
+        "Host: localhost\r\n"
+        "Connection: close\r\n"
+        "Content-Type: application/x-www-form-urlencoded\r\n"
+        f"Content-Length: {size}\r\n"
+        f"Cookie: csrftoken={token}\r\n"
+        f"X-CSRFToken: {token}\r\n"
+        "\r\n"
+    ).encode()
+    pieces = 20
+    while time.perf_counter() < deadline:
+        with socket.create_connection(("127.0.0.1", port), timeout=120) as sock:
+            sock.sendall(head)
+            for i in range(pieces):
+                time.sleep(duration / pieces)
+                sock.sendall(b"x" * (size * (i + 1) // pieces - size * i // pieces))
+            response = b""
+            while chunk := sock.recv(65536):
+                response += chunk
+        # The leaderboard doesn't accept POSTs, but only responds after the CSRF
+        # check has read the whole body
+        assert response.startswith(b"HTTP/1.1 405"), response[:100]
+        counts.append(1)
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the latency of pages served by gunicorn with sync workers (WSGI) and
+    by uvicorn (ASGI), with the same number of worker processes, while other clients
+    slowly upload request bodies. Each server is started on its own, as in
+    production, and measured first without and then with the slow clients. Needs
+    collected static files. The servers run against a temporary database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run each phase for"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=3, help="Number of server processes"
+        )
+        parser.add_argument(
+            "--clients", type=int, default=4, help="Number of concurrent page clients"
+        )
+        parser.add_argument(
+            "--slow-clients", type=int, default=6, help="Number of slow uploaders"
+        )
+        parser.add_argument(
+            "--slow-duration",
+            type=float,
+            default=2,
+            help="Seconds a slow client takes to send its request",
+        )
+        parser.add_argument(
+            "--slow-bytes", type=int, default=256 * 1024, help="Size of a slow request"
+        )
+        parser.add_argument(
+            "--entries", type=int, default=500, help="Number of leaderboard entries"
+        )
+
+    def run_phase(self, port, pages, num_slow, options):
+        deadline = time.perf_counter() + options["duration"]
+        latencies = {name: [] for name in pages}
+        slow_counts = []
+        threads = [
+            threading.Thread(target=get_pages, args=(port, pages, deadline, latencies))
+            for _ in range(options["clients"])
+        ] + [
+            threading.Thread(
+                target=slow_posts,
+                args=(
+                    port,
+                    reverse("eval:reconstruction"),
+                    options["slow_bytes"],
+                    options["slow_duration"],
+                    deadline,
+                    slow_counts,
+                ),
+            )
+            for _ in range(num_slow)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, len(slow_counts)
+
+    def handle(self, *args, **options):
+        if staticfiles_storage.read_manifest() is None:
+            raise CommandError("Run `python manage.py collectstatic` first.")
+
+        env = {
+            **os.environ,
+            "SPC_DEBUG": "False",
+            "SPC_SECRET_KEY": os.getenv("SPC_SECRET_KEY", get_random_secret_key()),
+            "SPC_QUERY_LOG_LEVEL": "WARNING",
+            "SPC_RATE_LIMITS": "False",
+        }
+        with scratch_database() as path:
+            # The servers find the database and its entries.version file here
+            env["SPC_DATABASEDIR"] = str(path.parent)
+            user, entries = seed_entries(options["entries"])
+            public = [entry for entry in entries if entry.visibility != "PRIV"]
+            pages = {
+                "index": lambda: reverse("index"),
+                "leaderboard": lambda: reverse("eval:reconstruction"),
+                "detail": lambda: reverse(
+                    "eval:detail", kwargs={"pk": random.choice(public).pk}
+                ),
+                "compare": lambda: reverse(
+                    "eval:compare",
+                    kwargs=dict(
+                        zip(["pk1", "pk2"], (e.pk for e in random.sample(public, 2)))
+                    ),
+                ),
+                "auth check": lambda: reverse(
+                    "auth-check",
+                    kwargs={
+                        "entry_type": "reconstruction",
+                        "user_pk": user.pk,
+                        "entry_uuid": random.choice(public).uuid,
+                        "path": "scene/000000.png",
+                    },
+                ),
+            }
+
+            for name, command in SERVERS.items():
+                port = free_port()
+                args = [
+                    arg.format(port=port, workers=options["workers"]) for arg in command
+                ]
+                process = subprocess.Popen(
+                    [sys.executable, "-m", *args],
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                try:
+                    wait_until_listening(process, port)
+                    self.stdout.write(
+                        self.style.MIGRATE_HEADING(
+                            f"{name}, {options['workers']} workers"
+                        )
+                    )
+                    for num_slow in (0, options["slow_clients"]):
+                        latencies, slow = self.run_phase(port, pages, num_slow, options)
+                        num_requests = sum(len(t) for t in latencies.values())
+                        self.stdout.write(
+                            f"  {num_requests / options['duration']:.0f} pages/s with "
+                            f"{options['clients']} clients, {num_slow} slow clients "
+                            f"({slow} slow requests)"
+                        )
+                        for page, values in latencies.items():
+                            self.stdout.write(
+                                f"  {page:>12}: {format_latencies(values)}"
+                            )
+                finally:
+                    process.terminate()
+                    process.wait()
@@ -0,0 +1,104 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from core.benchmarks import (
+    EvaluatorWrites,
+    benchmark_settings,
+    format_latencies,
+    scratch_database,
+    seed_entries,
+)
+
+ENGINES = {
+    "database": "django.contrib.sessions.backends.db",
+    "signed cookies": "core.sessions",
+}
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the latency of logging in, and of the leaderboard and detail pages for
+    a logged in user, with database and signed cookie sessions, while another thread
+    keeps taking the database write lock like the evaluator does, against a
+    temporary database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Number of requests per case"
+        )
+        parser.add_argument(
+            "--rounds", type=int, default=10, help="Number of turns per engine"
+        )
+        parser.add_argument(
+            "--entries", type=int, default=200, help="Number of leaderboard entries"
+        )
+        parser.add_argument(
+            "--hold", type=float, default=0.02, help="Seconds the write lock is held"
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.02, help="Seconds between writes"
+        )
+
+    @staticmethod
+    def timed(func, num_requests):
+        latencies = []
+        for _ in range(num_requests):
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def handle(self, *args, **options):
+        # Don't flood the output with per-request query stats
+        logging.getLogger("core.middleware").setLevel(logging.WARNING)
+
+        with scratch_database():
+            user, entries = seed_entries(options["entries"])
+            entry = entries[0]
+            writer = EvaluatorWrites(entry.pk, options["hold"], options["pause"])
+            writer.start()
+
+            urls = {
+                "leaderboard": reverse("eval:reconstruction"),
+                "detail": reverse("eval:detail", kwargs={"pk": entry.pk}),
+            }
+            latencies = {
+                (engine, case): [] for engine in ENGINES for case in ["login", *urls]
+            }
+
+            try:
+                clients = {}
+                for engine, backend in ENGINES.items():
+                    with benchmark_settings(SESSION_ENGINE=backend):
+                        clients[engine] = Client(HTTP_HOST="localhost")
+                        clients[engine].force_login(user)
+                        for url in urls.values():
+                            assert clients[engine].get(url).status_code == 200
+
+                # Engines take turns, such that drift (e.g. in the writer) affects them equally
+                rounds = options["rounds"]
+                for _ in range(rounds):
+                    for engine, backend in ENGINES.items():
+                        with benchmark_settings(SESSION_ENGINE=backend):
+                            latencies[engine, "login"] += self.timed(
+                                lambda: Client().force_login(user),
+                                options["requests"] // rounds,
+                            )
+                            client = clients[engine]
+                            for case, url in urls.items():
+                                latencies[engine, case] += self.timed(
+                                    lambda client=client, url=url: client.get(url),
+                                    options["requests"] // rounds,
+                                )
+            finally:
+                writer.stopped.set()
+                writer.join()
+
+        for (engine, case), values in latencies.items():
+            self.stdout.write(f"{engine:>15} {case:>12}: {format_latencies(values)}")
+        self.stdout.write(f"The writer held the write lock {writer.writes} times.")
@@ -0,0 +1,418 @@
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from core.benchmarks import (
+    benchmark_settings,
+    format_latencies,
+    percentiles,
+    scratch_database,
+)
+from core.media import sign_media_path
+from eval.cache import bump_entries_version
+from eval.models import EntryStatus, EntryVisibility, ReconstructionEntry, ResultSample
+
+User = get_user_model()
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+# The logged in personas, create_random's first user and a superuser
+PERSONA_EMAILS = {
+    "user": "user1@test.test",
+    "superuser": "bench-admin@test.test",
+}
+
+
+def scenarios(fixtures):
+    """Returns the (persona, name, url factory) of every benchmarked page. URLs are
+    picked at random from the seeded entries on every request, so that pages are
+    not all served from the same cached rows."""
+    public, private, other_private = (
+        fixtures["public"],
+        fixtures["private"] or fixtures["public"],
+        fixtures["other_private"] or fixtures["public"],
+    )
+    samples = fixtures["samples"]
+
+    def detail(pks):
+        return lambda rng: reverse("eval:detail", kwargs={"pk": rng.choice(pks)})
+
+    def compare(pks):
+        return lambda rng: reverse(
+            "eval:compare", kwargs={"pk1": rng.choice(pks), "pk2": rng.choice(public)}
+        )
+
+    def leaderboard(rng):
+        sortby = rng.choice(fixtures["sortby"])
+        page = rng.randint(1, fixtures["pages"])
+        return f"{reverse('eval:reconstruction')}?sortby={sortby}&page={page}"
+
+    def api(rng):
+        return f"{reverse('eval:reconstruction-api')}?limit=100"
+
+    def auth_check(signed):
+        def url(rng):
+            path = rng.choice(samples)
+            return f"/auth/check/{sign_media_path(path) if signed else path}"
+
+        return url
+
+    pages = [
+        ("anonymous", "index", lambda rng: reverse("index")),
+        ("anonymous", "leaderboard", leaderboard),
+        ("anonymous", "api", api),
+        ("anonymous", "detail", detail(public)),
+        ("anonymous", "compare", compare(public)),
+        ("anonymous", "random compare", lambda rng: reverse("eval:compare")),
+        ("anonymous", "auth check", auth_check(signed=False)),
+        ("anonymous", "signed auth check", auth_check(signed=True)),
+        ("user", "leaderboard", leaderboard),
+        ("user", "api", api),
+        ("user", "detail", detail(private)),
+        ("user", "compare", compare(private)),
+        ("user", "submit", lambda rng: reverse("eval:submit")),
+        ("user", "user page", lambda rng: reverse("core:user")),
+        ("user", "auth check", auth_check(signed=False)),
+        ("superuser", "leaderboard", leaderboard),
+        ("superuser", "detail", detail(other_private)),
+        (
+            "superuser",
+            "admin entries",
+            lambda rng: reverse("admin:eval_reconstructionentry_changelist"),
+        ),
+        (
+            "superuser",
+            "admin entry",
+            lambda rng: reverse(
+                "admin:eval_reconstructionentry_change", args=[rng.choice(public)]
+            ),
+        ),
+    ]
+    if not samples:
+        pages = [page for page in pages if "auth check" not in page[1]]
+    return pages
+
+
+def query_count(response):
+    """Number of queries made by the view, from the Server-Timing header added by
+    QueryStatsMiddleware, None for streaming responses."""
+    match = SERVER_TIMING_QUERIES.search(response.get("Server-Timing", ""))
+    return int(match.group(1)) if match else None
+
+
+class Sample:
+    """Latencies and query counts of the requests of a scenario, from all clients."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.queries = []
+        self.errors = []
+
+    def add(self, url, response, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            if (queries := query_count(response)) is not None:
+                self.queries.append(queries)
+            if response.status_code >= 400:
+                self.errors.append(f"{url}: {response.status_code}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = """
+    Benchmark the site's pages in process, as anonymous, logged in and superuser
+    clients, against a scratch database seeded with `create_random` at a given
+    scale. Each page is requested by concurrent clients, and its throughput, latency
+    percentiles and queries per request are reported, optionally as JSON to compare
+    runs across commits with `--baseline`. Pages are served by the async views when
+    run with SPC_ASGI=True.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--entries", type=int, default=20000, help="Number of seeded entries"
+        )
+        parser.add_argument(
+            "--users", type=int, default=200, help="Number of seeded users"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the data and requested URLs"
+        )
+        parser.add_argument(
+            "--database",
+            type=str,
+            help="SQLite file to seed, or to reuse if it exists, such that runs on "
+            "different commits use the same data (default: a temporary file)",
+        )
+        parser.add_argument(
+            "--clients", type=int, default=4, help="Number of concurrent clients"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Number of requests per page"
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            default=[],
+            help="Only benchmark the pages whose name contains one of these",
+        )
+        parser.add_argument("--json", type=str, help="Write the results to this file")
+        parser.add_argument(
+            "--baseline",
+            type=str,
+            help="Results of an earlier run (--json) to compare against",
+        )
+
+    def seed(self, options):
+        call_command(
+            "create_random",
+            options["entries"],
+            users=options["users"],
+            seed=options["seed"],
+            samples=True,
+            stdout=self.stdout,
+        )
+        User.objects.create_superuser(
+            email=PERSONA_EMAILS["superuser"], university="University of Benchmarks"
+        )
+        bump_entries_version()
+
+    def load_fixtures(self, users):
+        visible = ReconstructionEntry.objects.filter(
+            process_status=EntryStatus.SUCCESS, is_active=True
+        )
+        public = visible.exclude(visibility=EntryVisibility.PRIV)
+        private = visible.filter(visibility=EntryVisibility.PRIV)
+        public_pks = list(public.values_list("pk", flat=True))
+        if not public_pks:
+            raise CommandError("The database has no public entries to benchmark.")
+
+        return {
+            "public": public_pks,
+            "private": list(
+                private.filter(creator=users["user"]).values_list("pk", flat=True)
+            ),
+            "other_private": list(
+                private.exclude(creator=users["user"]).values_list("pk", flat=True)
+            ),
+            "samples": [
+                str(file)
+                for file in ResultSample.objects.filter(
+                    object_id__in=public_pks[:: max(1, len(public_pks) // 100)]
+                ).values_list("file", flat=True)
+            ],
+            "sortby": [
+                prefix + m.name
+                for m in ReconstructionEntry.metric_fields
+                for prefix in ("", "-")
+            ],
+            # Requesting pages past the end is fine, they show the last one
+            "pages": max(1, len(public_pks) // 100),
+        }
+
+    def clients(self, users, persona, num_clients):
+        clients = [
+            AsyncClient() if settings.ASGI else Client(HTTP_HOST="localhost")
+            for _ in range(num_clients)
+        ]
+        if persona in users:
+            for client in clients:
+                client.force_login(users[persona])
+        return clients
+
+    def run_sync(self, clients, make_url, num_requests, rng):
+        sample = Sample()
+        urls = [make_url(rng) for _ in range(num_requests)]
+
+        def requests(client, urls):
+            try:
+                for url in urls:
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    sample.add(url, response, time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=requests, args=(client, urls[i :: len(clients)]))
+            for i, client in enumerate(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sample, time.perf_counter() - start
+
+    def run_async(self, clients, make_url, num_requests, rng):
+        sample = Sample()
+        urls = [make_url(rng) for _ in range(num_requests)]
+
+        async def requests(client, urls):
+            for url in urls:
+                start = time.perf_counter()
+                response = await client.get(url)
+                if response.streaming and response.is_async:
+                    [chunk async for chunk in response.streaming_content]
+                elif response.streaming:
+                    # As the ASGI handler does for sync iterators, which may query
+                    await sync_to_async(b"".join)(response.streaming_content)
+                sample.add(url, response, time.perf_counter() - start)
+
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    requests(client, urls[i :: len(clients)])
+                    for i, client in enumerate(clients)
+                )
+            )
+            return time.perf_counter() - start
+
+        return sample, asyncio.run(run())
+
+    def bench(self, options):
+        users = {
+            persona: User.objects.get(email=email)
+            for persona, email in PERSONA_EMAILS.items()
+        }
+        fixtures = self.load_fixtures(users)
+        rng = random.Random(options["seed"])
+        run = self.run_async if settings.ASGI else self.run_sync
+
+        results = {}
+        for persona, name, make_url in scenarios(fixtures):
+            key = f"{persona} {name}"
+            if options["only"] and not any(word in key for word in options["only"]):
+                continue
+            clients = self.clients(users, persona, options["clients"])
+
+            # Warm up the caches and connections of every client
+            run(clients, make_url, len(clients), rng)
+            sample, elapsed = run(clients, make_url, options["requests"], rng)
+            if sample.errors:
+                raise CommandError(f"{key} failed: {', '.join(sample.errors[:5])}")
+
+            p50, p95, p99 = percentiles(sample.latencies)
+            results[key] = {
+                "requests": len(sample.latencies),
+                "throughput": len(sample.latencies) / elapsed,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "queries": (
+                    sum(sample.queries) / len(sample.queries)
+                    if sample.queries
+                    else None
+                ),
+            }
+            queries = results[key]["queries"]
+            self.stdout.write(
+                f"{key:>28}: {results[key]['throughput']:7.0f} req/s  "
+                f"{format_latencies(sample.latencies)}  "
+                f"{'-' if queries is None else f'{queries:.1f}':>4} queries"
+            )
+        return results
+
+    def compare(self, results, baseline):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"Compared to {baseline['commit']} ({baseline['server']})"
+            )
+        )
+        for key, result in results.items():
+            if key not in baseline["results"]:
+                continue
+            before = baseline["results"][key]
+            changes = [
+                f"{field} {(result[field] / before[field] - 1) * 100:+6.1f}%"
+                for field in ("throughput", "p50_ms", "p99_ms")
+                if before[field]
+            ]
+            if result["queries"] != before["queries"]:
+                changes.append(f"queries {before['queries']} -> {result['queries']}")
+            self.stdout.write(f"{key:>28}: {'  '.join(changes)}")
+
+    def handle(self, *args, **options):
+        # Don't flood the output with per-request query stats
+        logging.getLogger("core.middleware").setLevel(logging.WARNING)
+
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+
+        if options["database"]:
+            path = Path(options["database"]).resolve()
+            seeded = path.exists()
+        else:
+            fd, path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(fd)
+            path, seeded = Path(path), False
+
+        try:
+            with scratch_database(path):
+                if not seeded:
+                    self.seed(options)
+                entries = ReconstructionEntry.objects.count()
+                self.stdout.write(
+                    self.style.MIGRATE_HEADING(
+                        f"{entries} entries, {options['clients']} clients, "
+                        f"{'asgi' if settings.ASGI else 'wsgi'} views"
+                    )
+                )
+                # AsyncClient always sends the host "testserver"
+                with benchmark_settings(ALLOWED_HOSTS=["localhost", "testserver"]):
+                    results = self.bench(options)
+        finally:
+            if not options["database"]:
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+        report = {
+            "commit": git_commit(),
+            "server": "asgi" if settings.ASGI else "wsgi",
+            "python": platform.python_version(),
+            "entries": entries,
+            "clients": options["clients"],
+            "requests": options["requests"],
+            "seed": options["seed"],
+            "results": results,
+        }
+        if options["json"]:
+            Path(options["json"]).write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['json']}"))
+        if baseline:
+            self.compare(results, baseline)
@@ -0,0 +1,22 @@
+from core.exports import USER_FIELDS, ExportCommand
+from core.models import User
+
+
+class Command(ExportCommand):
+    help = "Export users as CSV or NDJSON, streamed in chunks."
+
+    fields = USER_FIELDS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--verified",
+            action="store_true",
+            help="Only export active and verified users",
+        )
+
+    def get_queryset(self, verified=False, **options):
+        users = User.objects.all()
+        if verified:
+            users = users.filter(is_active=True, is_verified=True)
+        return users
@@ -4,6 +4,8 @@ import sys
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 
+from core.exports import CHUNK_SIZE
+
 User = get_user_model()
 
 
@@ -17,22 +19,30 @@ class Command(BaseCommand):
             help="Path to the output CSV file (default: stdout)",
         )
 
+    def write_emails(self, f):
+        emails = (
+            User.objects.filter(is_active=True, is_verified=True)
+            .order_by("pk")
+            .values_list("email", flat=True)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        writer = csv.writer(f)
+        writer.writerow(["Email"])
+        count = 0
+        for email in emails:
+            writer.writerow([email])
+            count += 1
+        return count
+
     def handle(self, *args, **options):
         output_file = options.get("output")
-        users = User.objects.filter(is_active=True, is_verified=True)
 
         if output_file:
             try:
                 with open(output_file, "w", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["Email"])
-                    for user in users:
-                        writer.writerow([user.email])
-                self.stdout.write(self.style.SUCCESS(f"Successfully exported {users.count()} emails to {output_file}"))
+                    count = self.write_emails(f)
+                self.stdout.write(self.style.SUCCESS(f"Successfully exported {count} emails to {output_file}"))
             except Exception as e:
                 self.stderr.write(self.style.ERROR(f"Error writing to file: {e}"))
         else:
-            writer = csv.writer(sys.stdout)
-            writer.writerow(["Email"])
-            for user in users:
-                writer.writerow([user.email])
+            self.write_emails(sys.stdout)
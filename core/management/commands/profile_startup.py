@@ -0,0 +1,165 @@
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Loads the given target in a fresh interpreter. With --io, calls to blocking
+# builtins made while loading are timed and attributed to the innermost frame in
+# the project (or the caller, if outside of it), ignoring the import machinery.
+CHILD = r"""
+import json, os, runpy, sys, time
+
+target, base_dir, profile_io, *argv = sys.argv[1:]
+calls = {}
+stack = []
+BLOCKING = {
+    "open", "open_code", "stat", "lstat", "access", "mkdir", "makedirs", "listdir",
+    "scandir", "utime", "getaddrinfo", "gethostbyname", "gethostbyname_ex",
+    "gethostbyaddr", "connect", "system",
+}
+
+def site(frame):
+    caller = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and "/.venv/" not in filename:
+            caller = frame
+            break
+        frame = frame.f_back
+    filename = os.path.relpath(caller.f_code.co_filename, base_dir)
+    return f"{filename}:{caller.f_lineno} ({caller.f_code.co_name})"
+
+def profile(frame, event, arg):
+    if event == "c_call" and getattr(arg, "__name__", None) in BLOCKING:
+        if frame.f_code.co_filename.startswith("<frozen importlib"):
+            stack.append(None)
+        else:
+            stack.append((f"{arg.__module__ or ''}.{arg.__name__}".lstrip("."), site(frame), time.perf_counter()))
+    elif event in ("c_return", "c_exception") and getattr(arg, "__name__", None) in BLOCKING and stack:
+        if (call := stack.pop()) is not None:
+            name, where, start = call
+            count, total = calls.get((name, where), (0, 0.0))
+            calls[(name, where)] = (count + 1, total + time.perf_counter() - start)
+
+start = time.perf_counter()
+if profile_io == "1":
+    sys.setprofile(profile)
+try:
+    if target == "wsgi":
+        import spcwebsite.wsgi
+    else:
+        sys.argv = ["manage.py", *argv]
+        runpy.run_path(os.path.join(base_dir, "manage.py"), run_name="__main__")
+except SystemExit:
+    pass
+finally:
+    sys.setprofile(None)
+elapsed = time.perf_counter() - start
+
+print("\n@@PROFILE@@" + json.dumps({
+    "elapsed": elapsed,
+    "calls": [[name, where, count, total] for (name, where), (count, total) in calls.items()],
+}))
+"""
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class Command(BaseCommand):
+    help = """
+    Profile the startup of a gunicorn worker (importing spcwebsite.wsgi) and of a
+    manage.py command, each in fresh interpreters. Reports the wall time, the
+    slowest modules to import, and blocking I/O (file system and DNS) done while
+    starting up, by the code location that triggered it.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            choices=["wsgi", "manage", "both"],
+            default="both",
+            help="What to profile",
+        )
+        parser.add_argument(
+            "--manage-command",
+            default="check",
+            help="manage.py command (and arguments) to profile, e.g. 'help'",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Number of cold starts to time"
+        )
+        parser.add_argument(
+            "--top", type=int, default=15, help="Number of modules and calls to show"
+        )
+
+    def run_child(self, target, args, importtime=False, profile_io=False):
+        command = [sys.executable]
+        if importtime:
+            command += ["-X", "importtime"]
+        command += ["-c", CHILD, target, str(settings.BASE_DIR), str(int(profile_io))]
+        # The child exits normally even if the command fails, anything else is a crash
+        result = subprocess.run(
+            command + args,
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            check=False,
+        )
+        _, marker, data = result.stdout.rpartition("@@PROFILE@@")
+        if result.returncode or not marker:
+            raise CommandError(f"Profiling {target} failed:\n{result.stderr}")
+        return json.loads(data), result.stderr
+
+    def profile(self, target, args, options):
+        top = options["top"]
+        label = target if target == "wsgi" else f"manage.py {' '.join(args)}"
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Startup of {label}"))
+
+        # Wall time, the first start also warms the file system and bytecode caches
+        self.run_child(target, args)
+        elapsed = [
+            self.run_child(target, args)[0]["elapsed"] for _ in range(options["repeat"])
+        ]
+        self.stdout.write(
+            f"  {statistics.median(elapsed) * 1000:.0f}ms median, "
+            f"{min(elapsed) * 1000:.0f}ms min over {len(elapsed)} starts"
+        )
+
+        # Import time per module, as reported by the interpreter
+        _, stderr = self.run_child(target, args, importtime=True)
+        modules = [
+            (int(cumulative), int(own), len(indent) // 2, name)
+            for own, cumulative, indent, name in IMPORT_TIME.findall(stderr)
+        ]
+        self.stdout.write(
+            f"  Slowest imports ({len(modules)} modules, cumulative/self):"
+        )
+        for cumulative, own, depth, name in sorted(modules, reverse=True)[:top]:
+            self.stdout.write(
+                f"    {cumulative / 1000:8.1f}ms {own / 1000:8.1f}ms  {name}"
+            )
+
+        # Blocking calls outside of the import machinery
+        data, _ = self.run_child(target, args, profile_io=True)
+        calls = sorted(data["calls"], key=lambda call: call[3], reverse=True)
+        total = sum(call[3] for call in calls)
+        self.stdout.write(
+            f"  Blocking I/O: {sum(call[2] for call in calls)} calls in "
+            f"{total * 1000:.1f}ms (timings include profiling overhead):"
+        )
+        for name, where, count, seconds in calls[:top]:
+            self.stdout.write(
+                f"    {seconds * 1000:8.1f}ms {count:5}x  {name:<22} {where}"
+            )
+
+    def handle(self, *args, **options):
+        targets = (
+            ["wsgi", "manage"] if options["target"] == "both" else [options["target"]]
+        )
+        for target in targets:
+            args = options["manage_command"].split() if target == "manage" else []
+            self.profile(target, args, options)
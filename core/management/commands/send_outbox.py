@@ -0,0 +1,67 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.mail import send_batch
+from core.models import EmailStatus, OutboxEmail
+
+
+class Command(BaseCommand):
+    help = """
+    Send the emails queued in the outbox, in batches over a single connection to the
+    mail provider. Runs until stopped, polling for new emails, unless `--once` is
+    given. Sent emails are removed after `--keep-days`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send the emails that are due and exit",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=50, help="Emails sent per connection"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="Seconds to wait when there are no emails to send",
+        )
+        parser.add_argument(
+            "--keep-days",
+            type=float,
+            default=30,
+            help="Age after which sent emails are removed",
+        )
+
+    def prune(self, days):
+        removed, _ = OutboxEmail.objects.filter(
+            status=EmailStatus.SENT,
+            sent_at__lt=timezone.now() - timezone.timedelta(days=days),
+        ).delete()
+        if removed:
+            self.stdout.write(f"Removed {removed} sent emails.")
+
+    def handle(self, *args, **options):
+        # Let supervisord stop the sender in between batches, so that emails which
+        # were sent are marked as such
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+
+        pruned_at = 0
+        while not stopping:
+            if time.monotonic() - pruned_at > 3600:
+                self.prune(options["keep_days"])
+                pruned_at = time.monotonic()
+
+            sent, failed = send_batch(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+
+            if sent + failed < options["batch_size"]:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,119 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+
+from .routers import read_only
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs natively in both sync and async mode, where
+    `__acall__` handles requests when the next handler in the chain is async."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class QueryStats:
+    """Database execute wrapper that counts queries and sums their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class QueryStatsMiddleware(AsyncCapableMiddleware):
+    """Logs the number of queries and the time spent in the database for every
+    request, and exposes the same numbers to the browser via a Server-Timing header.
+
+    Note: Queries issued while a StreamingHttpResponse is being consumed happen
+    after the response leaves this middleware and are not counted.
+    """
+
+    @staticmethod
+    def wrap_connections(stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def handle(self, request):
+        stats = QueryStats()
+        with self.wrap_connections(stats):
+            response = self.get_response(request)
+        return self.add_stats(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        # Async requests query in the thread shared by their sync_to_async calls, the
+        # connections of which differ from those seen from the event loop
+        stack = await sync_to_async(self.wrap_connections)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.add_stats(request, response, stats)
+
+    def add_stats(self, request, response, stats):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        logger.info(
+            "%s %s [%s] %d queries in %.1fms",
+            request.method,
+            request.path,
+            view_name,
+            stats.count,
+            stats.duration * 1000,
+        )
+        response["Server-Timing"] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        )
+        return response
+
+
+class ReadOnlyRoutingMiddleware(AsyncCapableMiddleware):
+    """Marks safe requests (GET, HEAD, OPTIONS) as read-only, such that their reads
+    are routed to the read-only database connection by `core.routers.ReadOnlyRouter`.
+    Writes made by such requests, e.g. activating an account, still go to the default
+    connection.
+    """
+
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def handle(self, request):
+        token = read_only.set(request.method in self.SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            read_only.reset(token)
+
+    async def __acall__(self, request):
+        # Context variables are copied into the threads of sync_to_async
+        token = read_only.set(request.method in self.SAFE_METHODS)
+        try:
+            return await self.get_response(request)
+        finally:
+            read_only.reset(token)
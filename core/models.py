@@ -5,8 +5,11 @@ from django.contrib.auth.models import (
 )
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 
-from eval.constants import MAX_UPLOADS_PER_DAY, UPLOADS_ENABLED
+from eval.constants import UPLOADS_ENABLED
+
+from .quotas import UPLOADS
 
 
 class UserManager(BaseUserManager):
@@ -56,21 +59,71 @@ class User(AbstractBaseUser, PermissionsMixin):
     def maildomain(self):
         return self.email.split("@")[-1]
 
+    @cached_property
+    def recent_uploads(self):
+        # Queried once per request, the user is loaded anew for every request
+        return UPLOADS.recent(self)
+
+    def uploads_remaining(self):
+        return UPLOADS.remaining(self.recent_uploads)
+
+    def uploads_available_at(self):
+        return UPLOADS.available_at(self.recent_uploads)
+
     def can_upload(self):
         # A user can always upload if they are a superuser, else they must:
         #   1) Be verified (email is checked)
         #   2) Be active (maybe they were deactivated by an admin)
-        #   3) Not have submitted too many times in the last 24h
-        # Note: We consider all uploads for this, not just active (un-deleted) ones
-        #   as otherwise users can DDoS the server by uploading and deleting repeatedly.
-        date_from = timezone.now() - timezone.timedelta(days=1)
+        #   3) Not have submitted too many times in the last 24h, see core/quotas.py
         return self.is_superuser or (
             self.is_verified
             and self.is_active
-            and len(self.entries.filter(pub_date__gte=date_from)) < MAX_UPLOADS_PER_DAY
             and UPLOADS_ENABLED
+            and self.uploads_remaining() > 0
         )
 
     @property
     def is_staff(self):
         return self.is_superuser
+
+
+class EmailStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    SENT = "SENT", "Sent"
+    FAILED = "FAILED", "Failed"
+
+
+class OutboxEmail(models.Model):
+    # Queued by core.mail.OutboxBackend, sent by `manage.py send_outbox`
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    subject = models.TextField()
+    body = models.TextField()
+    # Pairs of (content, mimetype), e.g. an HTML version of the body
+    alternatives = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+
+    # Hash of the sender, recipients and subject, see OUTBOX_DEDUP_SECONDS
+    dedup_key = models.CharField(max_length=64)
+    # Incremented whenever the content is replaced by a duplicate, see core.mail
+    version = models.PositiveIntegerField(default=0)
+    status = models.CharField(
+        max_length=7, choices=EmailStatus.choices, default=EmailStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["dedup_key", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
@@ -0,0 +1,30 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator for the admin changelists of large tables, where counting the rows
+    is the slowest query of every page. Counts of at least `min_cached_count` rows
+    are cached per query for `timeout` seconds, so the number of results and pages
+    shown may be a little out of date. Smaller counts are exact."""
+
+    min_cached_count = 10000
+    timeout = 60
+
+    @cached_property
+    def count(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+
+        key = "count:" + hashlib.sha256(repr((sql, params)).encode()).hexdigest()
+        if (count := cache.get(key)) is None:
+            count = self.object_list.count()
+            if count >= self.min_cached_count:
+                cache.set(key, count, self.timeout)
+        return count
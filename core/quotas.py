@@ -0,0 +1,145 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from eval.constants import MAX_UPLOADS_PER_DAY
+
+
+def client_ip(request):
+    # Behind Caddy every request comes from localhost, which forwards the client's
+    # address as the last entry of X-Forwarded-For
+    addr = request.META.get("REMOTE_ADDR", "")
+    if addr in settings.TRUSTED_PROXIES and (
+        forwarded := request.META.get("HTTP_X_FORWARDED_FOR")
+    ):
+        return forwarded.rsplit(",", 1)[-1].strip()
+    return addr
+
+
+class RateLimit:
+    """Allows `limit` requests per client in any window of `period` seconds.
+
+    The sliding window is approximated by counting requests per fixed window, and
+    adding the count of the previous window weighted by how much of it the sliding
+    window still overlaps. A check is a constant number of cache operations. The
+    counters are kept in the local, per process, cache so they never touch the
+    database; a client may get up to one limit per worker process.
+
+    Clients are logged in users, or anonymous clients by IP address. Limits that
+    are `per_ip` count by IP address even for logged in users.
+    """
+
+    def __init__(self, name, limit, period, per_ip=False):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.per_ip = per_ip
+
+    def client(self, request):
+        user = getattr(request, "user", None)
+        if not self.per_ip and user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{client_ip(request)}"
+
+    def keys(self, request, now):
+        window = int(now // self.period)
+        prefix = f"ratelimit:{self.name}:{self.client(request)}"
+        return f"{prefix}:{window}", f"{prefix}:{window - 1}"
+
+    def counts(self, request, now):
+        """Returns the counts of the current and previous windows, and the elapsed
+        fraction of the current window."""
+        current, previous = self.keys(request, now)
+        counts = cache.get_many([current, previous])
+        elapsed = (now % self.period) / self.period
+        return counts.get(current, 0), counts.get(previous, 0), elapsed
+
+    def remaining(self, request):
+        current, previous, elapsed = self.counts(request, time.time())
+        return max(0, math.floor(self.limit - current - previous * (1 - elapsed)))
+
+    def retry_after(self, request):
+        """Seconds until the client may make another request."""
+        current, previous, elapsed = self.counts(request, time.time())
+        allowed = self.limit - 1
+        if current <= allowed:
+            # Wait for the previous window's weight to decay enough
+            wait = (
+                max(0, 1 - elapsed - (allowed - current) / previous) if previous else 0
+            )
+        else:
+            # Wait for the current window to become the previous one and decay
+            wait = 1 - elapsed + 1 - allowed / current
+        return math.ceil(wait * self.period)
+
+    def hit(self, request):
+        """Counts a request, unless the client is over the limit. Returns whether the
+        request is allowed."""
+        if not settings.RATE_LIMITS_ENABLED:
+            return True
+
+        now = time.time()
+        current, previous, elapsed = self.counts(request, now)
+        if current + previous * (1 - elapsed) + 1 > self.limit:
+            return False
+
+        # A window's counter is needed until the end of the next one
+        key, _ = self.keys(request, now)
+        if not cache.add(key, 1, timeout=2 * self.period):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Expired in between
+                cache.add(key, 1, timeout=2 * self.period)
+        return True
+
+    def too_many_requests(self, request):
+        return HttpResponse(
+            "Too many requests, please try again later.",
+            status=429,
+            headers={"Retry-After": str(self.retry_after(request))},
+        )
+
+
+class UploadQuota:
+    """Allows `limit` uploads per user in any window of `period` seconds.
+
+    Unlike rate limits this must hold across processes, so uploads are counted in
+    the database. At most `limit` recent uploads are read, using the index on
+    (creator, pub_date).
+    """
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+
+    def recent(self, user):
+        """Returns the dates of the user's uploads in the window, oldest first."""
+        since = timezone.now() - timezone.timedelta(seconds=self.period)
+        return list(
+            user.entries.filter(pub_date__gte=since)
+            .order_by("pub_date")
+            .values_list("pub_date", flat=True)[: self.limit]
+        )
+
+    def remaining(self, recent):
+        return max(0, self.limit - len(recent))
+
+    def available_at(self, recent):
+        """Returns when the next upload is allowed, or None if it is allowed now."""
+        if self.remaining(recent):
+            return None
+        return recent[0] + timezone.timedelta(seconds=self.period)
+
+
+# Note: We consider all uploads for this, not just active (un-deleted) ones
+#   as otherwise users can DDoS the server by uploading and deleting repeatedly.
+UPLOADS = UploadQuota(MAX_UPLOADS_PER_DAY, 24 * 60 * 60)
+
+SIGNUPS = RateLimit("signup", limit=5, period=60 * 60, per_ip=True)
+CONFIRMATION_RESENDS = RateLimit("resend", limit=3, period=60 * 60)
+COMPARES = RateLimit("compare", limit=60, period=60)
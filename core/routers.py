@@ -0,0 +1,33 @@
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ONLY_ALIAS = "readonly"
+
+# Set for the duration of requests that shouldn't write, see ReadOnlyRoutingMiddleware
+read_only = ContextVar("read_only", default=False)
+
+
+class ReadOnlyRouter:
+    """Sends the reads of read-only requests to a `query_only` connection to the same
+    database, which never takes the write lock nor starts write transactions.
+
+    Everything else uses the default connection, including reads inside a
+    transaction, so that these see the transaction's own writes. Writes always go to
+    the default connection, also for objects that were read on the read-only one.
+    """
+
+    def db_for_read(self, model, **hints):
+        if read_only.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return READ_ONLY_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, READ_ONLY_ALIAS}
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != READ_ONLY_ALIAS
@@ -0,0 +1,35 @@
+from django.contrib.sessions.backends import db, signed_cookies
+
+
+class SessionStore(signed_cookies.SessionStore):
+    """Sessions stored in signed cookies, so that requests never read or write the
+    session table, which would compete with the evaluator for the database lock.
+
+    Sessions created by the database backend previously used are still accepted:
+    the first time such a session key is seen its data is loaded from the database,
+    the row is deleted, and the session is sent back as a signed cookie.
+    """
+
+    def is_legacy_key(self):
+        # Database session keys are 32 random lowercase alphanumeric characters,
+        # signed cookies always contain a ":" separator
+        key = self.session_key
+        return bool(key) and len(key) == 32 and key.isalnum()
+
+    def load(self):
+        if self.is_legacy_key():
+            legacy = db.SessionStore(self.session_key)
+            if data := legacy.load():
+                legacy.delete()
+                self.modified = True
+                return data
+        return super().load()
+
+    async def aload(self):
+        if self.is_legacy_key():
+            legacy = db.SessionStore(self.session_key)
+            if data := await legacy.aload():
+                await legacy.adelete()
+                self.modified = True
+                return data
+        return super().load()
@@ -0,0 +1,72 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".mjs",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".html",
+}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Static files storage that, on top of content-hashed names and a manifest,
+    writes gzip and brotli variants next to compressible files. Caddy serves these
+    in place of the originals to clients that accept them.
+
+    Variants are only kept if they are meaningfully smaller than the original, and
+    are compressed in parallel as zlib and brotli release the GIL.
+    """
+
+    # Only keep compressed variants that save at least this fraction of the size
+    min_saving = 0.05
+    max_workers = 8
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # Compress both the hashed files and the originals, which are still served
+        names = {*paths, *self.hashed_files.values()}
+        names = sorted(
+            name
+            for name in names
+            if PurePosixPath(name).suffix.lower() in COMPRESSIBLE_EXTENSIONS
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for name, variants in zip(names, executor.map(self.compress, names)):
+                for variant in variants:
+                    yield name, variant, True
+
+    def compress(self, name):
+        """Writes the compressed variants of a file, returns their names."""
+        with self.open(name) as f:
+            data = f.read()
+
+        compressors = [
+            (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+            (".br", lambda data: brotli.compress(data, quality=11)),
+        ]
+
+        variants = []
+        for suffix, compress in compressors:
+            path = self.path(name + suffix)
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - self.min_saving):
+                with open(path, "wb") as f:
+                    f.write(compressed)
+                variants.append(name + suffix)
+            elif self.exists(name + suffix):
+                # Don't leave a stale variant of a previous version around
+                self.delete(name + suffix)
+        return variants
@@ -0,0 +1,365 @@
+import tempfile
+import time
+from pathlib import Path
+from smtplib import SMTPException
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.benchmarks import benchmark_settings
+from core.mail import enqueue, send_batch
+from core.media import sign_media_path
+from core.models import EmailStatus, OutboxEmail
+from core.views import AccountActivationTokenGenerator
+from eval.cache import bump_entries_version
+from eval.constants import MEDIA_DIRECTORY
+from eval.models import EntryStatus, EntryVisibility, ReconstructionEntry, ResultSample
+
+User = get_user_model()
+
+# Number of queries made per (persona, url name), with cold caches. Logged in personas
+# pay one query for loading the user on every request that needs it, sessions are
+# signed cookies.
+QUERY_BUDGETS = [
+    # persona, url name, url kwargs, method, budget
+    ("anonymous", "index", {}, "get", 0),
+    ("anonymous", "download", {}, "get", 0),
+    ("anonymous", "faq", {}, "get", 0),
+    ("anonymous", "competition", {}, "get", 0),
+    ("anonymous", "eval:reconstruction", {}, "get", 2),
+    ("anonymous", "eval:reconstruction-api", {}, "get", 1),
+    ("anonymous", "eval:detail", {"pk": "public"}, "get", 3),
+    ("anonymous", "eval:compare", {"pk1": "public", "pk2": "anon"}, "get", 2),
+    ("anonymous", "eval:compare", {}, "get", 1),
+    ("anonymous", "auth-check", "sample", "get", 1),
+    ("anonymous", "core:signup", {}, "get", 1),
+    ("anonymous", "core:confirm", {}, "get", 0),
+    ("anonymous", "core:activate", "activation", "get", 2),
+    ("anonymous", "core:login", {}, "get", 0),
+    ("anonymous", "core:password_reset", {}, "get", 0),
+    ("user", "index", {}, "get", 1),
+    ("user", "eval:reconstruction", {}, "get", 3),
+    ("user", "eval:reconstruction-api", {}, "get", 2),
+    ("user", "eval:submit", {}, "get", 2),
+    ("user", "eval:detail", {"pk": "private"}, "get", 5),
+    ("user", "eval:compare", {"pk1": "private", "pk2": "public"}, "get", 3),
+    ("user", "eval:compare", {}, "get", 3),
+    ("user", "eval:edit", {"pk": "private"}, "get", 2),
+    ("user", "eval:delete", {"pk": "private"}, "get", 2),
+    ("user", "auth-check", "sample", "get", 2),
+    ("user", "core:user", {}, "get", 3),
+    # Queueing the email, inside a savepoint as tests run in a transaction
+    ("user", "core:resend", {}, "post", 5),
+    ("user", "core:password_change", {}, "get", 1),
+    ("user", "core:password_change_done", {}, "get", 1),
+    ("superuser", "eval:reconstruction", {}, "get", 3),
+    ("superuser", "eval:detail", {"pk": "other_private"}, "get", 4),
+    ("superuser", "auth-check", "sample", "get", 2),
+]
+
+
+# The test runner swaps the email backend for one that makes no queries
+@benchmark_settings(EMAIL_BACKEND="core.mail.OutboxBackend")
+class QueryBudgetTests(TestCase):
+    """Requests every URL as different personas and checks the number of database
+    queries, which must not depend on the number of entries."""
+
+    NUM_ENTRIES = 50
+
+    @classmethod
+    def setUpClass(cls):
+        # Entry ids are cached per process until the version file changes, use a
+        # version file of our own to drop these before every request
+        directory = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(
+            mock.patch("eval.cache.VERSION_FILE", Path(directory) / "entries.version")
+        )
+        # Read from the environment at import, the submit page depends on it
+        cls.enterClassContext(mock.patch("core.models.UPLOADS_ENABLED", True))
+        cls.enterClassContext(mock.patch("core.views.UPLOADS_ENABLED", True))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            "user": User.objects.create_user(
+                email="user@test.test",
+                university="University of Budgets",
+                is_active=True,
+                is_verified=True,
+            ),
+            "other": User.objects.create_user(
+                email="other@test.test",
+                university="University of Budgets",
+                is_active=True,
+                is_verified=True,
+            ),
+            "superuser": User.objects.create_superuser(
+                email="superuser@test.test",
+                university="University of Budgets",
+            ),
+        }
+
+        def create_entry(creator, visibility):
+            entry = ReconstructionEntry.objects.create(
+                creator=creator,
+                name=f"budget-{visibility.lower()}",
+                pub_date=timezone.now(),
+                visibility=visibility,
+                process_status=EntryStatus.SUCCESS,
+                **{m.name: 0.5 for m in ReconstructionEntry.metric_fields},
+            )
+            for frame in range(3):
+                subpath = f"scene/{frame:06}.png"
+                ResultSample.objects.create(
+                    entry=entry,
+                    file=str(
+                        (entry.sample_directory / subpath).relative_to(MEDIA_DIRECTORY)
+                    ),
+                    subpath=subpath,
+                )
+            return entry
+
+        cls.entries = {
+            "private": create_entry(cls.users["user"], EntryVisibility.PRIV),
+            "public": create_entry(cls.users["other"], EntryVisibility.PUBL),
+            "anon": create_entry(cls.users["other"], EntryVisibility.ANON),
+            "other_private": create_entry(cls.users["other"], EntryVisibility.PRIV),
+        }
+        for _ in range(cls.NUM_ENTRIES):
+            create_entry(cls.users["other"], EntryVisibility.PUBL)
+
+        unverified = User.objects.create_user(
+            email="unverified@test.test",
+            university="University of Budgets",
+            is_active=True,
+        )
+        cls.special_urls = {
+            "activation": reverse(
+                "core:activate",
+                kwargs={
+                    "uidb64": urlsafe_base64_encode(force_bytes(unverified.pk)),
+                    "token": AccountActivationTokenGenerator().make_token(unverified),
+                },
+            ),
+            "sample": reverse(
+                "auth-check",
+                kwargs={
+                    "entry_type": ReconstructionEntry.PREFIX,
+                    "user_pk": cls.entries["public"].creator_id,
+                    "entry_uuid": cls.entries["public"].uuid,
+                    "path": "scene/000000.png",
+                },
+            ),
+        }
+
+    def setUp(self):
+        self.clients = {"anonymous": Client()}
+        for persona in ("user", "superuser"):
+            self.clients[persona] = Client()
+            self.clients[persona].force_login(self.users[persona])
+
+    def resolve_url(self, name, kwargs):
+        if isinstance(kwargs, str):
+            return self.special_urls[kwargs]
+        return reverse(name, kwargs={k: self.entries[v].pk for k, v in kwargs.items()})
+
+    def test_query_budgets(self):
+        for persona, name, kwargs, method, budget in QUERY_BUDGETS:
+            url = self.resolve_url(name, kwargs)
+            with self.subTest(persona=persona, method=method, url=url):
+                # Cached entries would make the counts depend on the order of requests,
+                # bumping the version drops the per-process caches of eval/cache.py
+                cache.clear()
+                bump_entries_version()
+                with self.assertNumQueries(budget):
+                    response = getattr(self.clients[persona], method)(url)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertLess(response.status_code, 400)
+
+
+@override_settings(DEBUG=False)
+class MediaSignatureTests(TestCase):
+    """Signed media urls of a private entry are served without a lookup, and fall
+    back to the visibility check once expired or tampered with."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user(
+            email="creator@test.test", university="University of Signatures"
+        )
+        entry = ReconstructionEntry.objects.create(
+            creator=creator,
+            name="private",
+            pub_date=timezone.now(),
+            visibility=EntryVisibility.PRIV,
+            process_status=EntryStatus.SUCCESS,
+        )
+        cls.path = str(
+            (entry.sample_directory / "scene/000000.png").relative_to(MEDIA_DIRECTORY)
+        )
+
+    def get(self, signed_path):
+        return self.client.get(f"/auth/check/{signed_path}")
+
+    def test_valid_signature(self):
+        self.assertEqual(self.get(sign_media_path(self.path)).status_code, 200)
+
+    def test_unsigned(self):
+        self.assertEqual(self.get(self.path).status_code, 401)
+
+    def test_expired_signature(self):
+        now = time.time() - 3 * settings.SIGNED_MEDIA_TTL
+        self.assertEqual(self.get(sign_media_path(self.path, now)).status_code, 401)
+
+    def test_tampered_signature(self):
+        signed = sign_media_path(self.path)
+        flipped = "1" if signed.endswith("0") else "0"
+        self.assertEqual(self.get(signed[:-1] + flipped).status_code, 401)
+        # A signature is only valid for the path and expiry it was made for
+        path, query = signed.split("?")
+        other = path.replace("000000.png", "000001.png")
+        self.assertEqual(self.get(f"{other}?{query}").status_code, 401)
+        expires = int(query.split("&")[0].removeprefix("expires="))
+        tampered = query.replace(str(expires), str(expires + 1))
+        self.assertEqual(self.get(f"{path}?{tampered}").status_code, 401)
+
+
+class RejectingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException("Mailbox unavailable")
+
+
+class UnreachableBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+
+class ReplacingBackend(EmailBackend):
+    """Queues a duplicate of every email while it is being sent."""
+
+    def send_messages(self, messages):
+        for message in messages:
+            enqueue(make_email(body="Replaced"))
+        return super().send_messages(messages)
+
+
+def make_email(body="Hello", to="user@test.test"):
+    return EmailMessage("Welcome", body, "noreply@test.test", [to])
+
+
+@override_settings(
+    OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    OUTBOX_MAX_ATTEMPTS=3,
+)
+class OutboxTests(TestCase):
+    """Emails are queued in the outbox, deduplicated while pending or recently sent,
+    and retried with a backoff until they run out of attempts."""
+
+    def retry_all(self):
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+
+    def send_failing(self):
+        with self.assertLogs("core.mail", "WARNING"):
+            return send_batch(10)
+
+    def test_send(self):
+        self.assertTrue(enqueue(make_email()))
+        self.assertEqual(send_batch(10), (1, 0))
+        self.assertEqual([m.body for m in mail.outbox], ["Hello"])
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, EmailStatus.SENT)
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(send_batch(10), (0, 0))
+
+    def test_duplicate_replaces_pending(self):
+        self.assertTrue(enqueue(make_email()))
+        self.assertTrue(enqueue(make_email(body="Newer")))
+        self.assertTrue(enqueue(make_email(to="other@test.test")))
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+
+        self.assertEqual(send_batch(10), (2, 0))
+        self.assertEqual(sorted(m.body for m in mail.outbox), ["Hello", "Newer"])
+
+    def test_duplicate_of_sent_is_dropped(self):
+        enqueue(make_email())
+        send_batch(10)
+        self.assertFalse(enqueue(make_email(body="Again")))
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        self.assertEqual(send_batch(10), (0, 0))
+
+    def test_replaced_while_sending(self):
+        enqueue(make_email())
+        with self.settings(OUTBOX_EMAIL_BACKEND="core.tests.ReplacingBackend"):
+            self.assertEqual(send_batch(10), (1, 0))
+        # The old content was sent, the new content is still to be sent
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertEqual(email.body, "Replaced")
+
+        self.assertEqual(send_batch(10), (1, 0))
+        self.assertEqual([m.body for m in mail.outbox], ["Hello", "Replaced"])
+        self.assertEqual(OutboxEmail.objects.get().status, EmailStatus.SENT)
+
+    @override_settings(OUTBOX_EMAIL_BACKEND="core.tests.RejectingBackend")
+    def test_backoff(self):
+        enqueue(make_email())
+        start = timezone.now()
+        self.assertEqual(self.send_failing(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, "SMTPException: Mailbox unavailable")
+        self.assertGreaterEqual(
+            email.next_attempt_at - start,
+            timezone.timedelta(seconds=settings.OUTBOX_RETRY_SECONDS),
+        )
+        # Not due yet
+        self.assertEqual(send_batch(10), (0, 0))
+
+        self.retry_all()
+        start = timezone.now()
+        self.assertEqual(self.send_failing(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreaterEqual(
+            email.next_attempt_at - start,
+            timezone.timedelta(seconds=2 * settings.OUTBOX_RETRY_SECONDS),
+        )
+
+    @override_settings(OUTBOX_EMAIL_BACKEND="core.tests.RejectingBackend")
+    def test_failed_after_max_attempts(self):
+        enqueue(make_email())
+        for _ in range(settings.OUTBOX_MAX_ATTEMPTS):
+            self.assertEqual(self.send_failing(), (0, 1))
+            self.retry_all()
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, EmailStatus.FAILED)
+        self.assertEqual(email.attempts, settings.OUTBOX_MAX_ATTEMPTS)
+        self.assertEqual(send_batch(10), (0, 0))
+        # A failed email doesn't hold back a new one
+        self.assertTrue(enqueue(make_email()))
+
+    @override_settings(OUTBOX_EMAIL_BACKEND="core.tests.UnreachableBackend")
+    def test_connection_failure(self):
+        enqueue(make_email())
+        enqueue(make_email(to="other@test.test"))
+        self.assertEqual(self.send_failing(), (0, 2))
+        for email in OutboxEmail.objects.all():
+            self.assertEqual(email.status, EmailStatus.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(
+                email.last_error, "ConnectionRefusedError: Connection refused"
+            )
+        self.assertEqual(mail.outbox, [])
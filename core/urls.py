@@ -10,7 +10,9 @@ urlpatterns = [
     path("user", views.userindex, name="user"),
     path(
         "confirm",
-        TemplateView.as_view(template_name="registration/confirm_request.html"),
+        views.server_view(TemplateView, views.AsyncTemplateView).as_view(
+            template_name="registration/confirm_request.html"
+        ),
         name="confirm",
     ),
     path("activate/<slug:uidb64>/<slug:token>/", views.activate, name="activate"),
@@ -6,18 +6,22 @@ from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.mail import send_mail
 from django.http import Http404, HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.views import View
+from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 
+from eval.cache import entry_access
 from eval.constants import UPLOADS_ENABLED
 from eval.models import ReconstructionEntry
 
 from .forms import UserCreationForm
+from .media import check_media_signature
+from .quotas import CONFIRMATION_RESENDS, SIGNUPS
 
 
 def send_confirmation_email(request, user=None):
@@ -40,12 +44,32 @@ class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
         return str(user.pk) + str(timestamp) + str(user.is_active)
 
 
+def server_view(sync_view, async_view):
+    """Picks the async variant of a view when served by ASGI, where sync views are
+    run in a thread, and the sync one under WSGI, where async views are run in an
+    event loop of their own."""
+    return async_view if settings.ASGI else sync_view
+
+
+class AsyncTemplateView(TemplateView):
+    # The response is rendered lazily, which Django does in a thread
+    async def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
 class SignupView(FormView):
     template_name = "registration/signup.html"
     success_url = reverse_lazy("core:confirm")
     form_class = UserCreationForm
 
     def form_valid(self, form):
+        if not SIGNUPS.hit(self.request):
+            form.add_error(
+                None,
+                "Too many accounts were created from your network, try again later.",
+            )
+            return self.form_invalid(form)
+
         # save form in the memory not in database
         user = form.save(commit=False)
         user.is_verified = False
@@ -58,6 +82,8 @@ class SignupView(FormView):
 
 class ResendView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
+        if not CONFIRMATION_RESENDS.hit(request):
+            return CONFIRMATION_RESENDS.too_many_requests(request)
         send_confirmation_email(request)
         return redirect("/")
 
@@ -81,19 +107,71 @@ def userindex(request):
     entries_list = ReconstructionEntry.objects.filter(
         creator__exact=request.user.pk, is_active=True
     ).order_by("-pub_date")
-    context = {"entries_list": entries_list, "uploads_enabled": UPLOADS_ENABLED}
+    context = {
+        "entries_list": entries_list,
+        "uploads_enabled": UPLOADS_ENABLED,
+        # Evaluate once, the template would otherwise re-query it for every use
+        "can_upload": request.user.can_upload(),
+        "uploads_remaining": request.user.uploads_remaining(),
+        "uploads_available_at": request.user.uploads_available_at(),
+        "resends_remaining": CONFIRMATION_RESENDS.remaining(request),
+    }
     return render(request, "userindex.html", context)
 
 
-def forward_auth_check(request, entry_type=None, entry_uuid=None, **kwargs):
+def get_entry_model(entry_type):
     entry_model = {"reconstruction": ReconstructionEntry}.get(entry_type)
 
     if entry_model is None:
         raise Http404(f"Entry type {entry_type} does not exist.")
+    return entry_model
+
 
-    entry = get_object_or_404(entry_model, uuid=entry_uuid, is_active=True)
+def has_media_signature(request):
+    # Signed urls are handed out when rendering a page the user was allowed to see,
+    # these can be checked without touching the database. Unsigned urls, or ones
+    # whose signature has expired, fall back to looking up the entry.
+    return check_media_signature(
+        request.path.removeprefix("/auth/check/"),
+        request.GET.get("expires"),
+        request.GET.get("signature"),
+    )
 
-    if entry.can_be_seen_by(request.user):
+
+def forward_auth_check(request, entry_type=None, entry_uuid=None, **kwargs):
+    entry_model = get_entry_model(entry_type)
+
+    if has_media_signature(request):
+        can_be_seen = True
+    else:
+        access = entry_access.get(entry_model, entry_uuid)
+        if access is None or not access.is_active:
+            raise Http404(f"No active entry with uuid {entry_uuid}.")
+        can_be_seen = entry_model.is_visible_to(
+            request.user, access.creator_id, access.visibility
+        )
+    return auth_check_response(request, can_be_seen)
+
+
+async def aforward_auth_check(request, entry_type=None, entry_uuid=None, **kwargs):
+    """Async version of `forward_auth_check`, which only leaves the event loop when
+    the entry or the user have to be fetched from the database."""
+    entry_model = get_entry_model(entry_type)
+
+    if has_media_signature(request):
+        can_be_seen = True
+    else:
+        access = await entry_access.aget(entry_model, entry_uuid)
+        if access is None or not access.is_active:
+            raise Http404(f"No active entry with uuid {entry_uuid}.")
+        can_be_seen = entry_model.is_visible_to(
+            await request.auser(), access.creator_id, access.visibility
+        )
+    return auth_check_response(request, can_be_seen)
+
+
+def auth_check_response(request, can_be_seen):
+    if can_be_seen:
         # If debug, we can just serve the file directly
         # this should not be used in prod, nor in debug really
         # since the /auth/check endpoint won't be redirected to
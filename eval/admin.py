@@ -1,6 +1,10 @@
 from django import forms
 from django.contrib import admin
-from django.contrib.contenttypes.admin import GenericTabularInline
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django_admin_action_forms import (
     AdminActionForm,
@@ -8,6 +12,10 @@ from django_admin_action_forms import (
     action_with_form,
 )
 
+from core.exports import ENTRY_FIELDS, export_actions
+from core.pagination import CachedCountPaginator
+
+from .cache import bump_entries_version
 from .models import EntryVisibility, ReconstructionEntry, ResultSample
 
 
@@ -34,9 +42,25 @@ class ChangeMetricsForm(AdminActionForm, forms.ModelForm):
             self.fields[field].required = False
 
 
-class ResultSamplesInline(GenericTabularInline):
-    model = ResultSample
-    extra = 0
+class CreatorFilter(admin.SimpleListFilter):
+    """Filters entries by creator, e.g. when following the link from the user admin,
+    without listing every user in the sidebar. Only the selected creator is shown,
+    other creators are found by searching for their email."""
+
+    title = "creator"
+    parameter_name = "creator"
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or "").isdigit():
+            return []
+        return (
+            get_user_model().objects.filter(pk=self.value()).values_list("pk", "email")
+        )
+
+    def queryset(self, request, queryset):
+        if (self.value() or "").isdigit():
+            return queryset.filter(creator_id=self.value())
+        return queryset
 
 
 class ResultEntryAdmin(AdminActionFormsMixin, admin.ModelAdmin):
@@ -45,25 +69,58 @@ class ResultEntryAdmin(AdminActionFormsMixin, admin.ModelAdmin):
         "pub_date",
         "visibility",
         "process_status",
-        "creator",
-    ]
-    inlines = [
-        ResultSamplesInline,
+        "creator_link",
     ]
+    list_select_related = ["creator"]
     ordering = ("pub_date",)
-    list_filter = ("visibility", "is_active", "process_status", "creator", "pub_date")
+    list_filter = (
+        "visibility",
+        "is_active",
+        "process_status",
+        CreatorFilter,
+        "pub_date",
+    )
+    search_fields = ("name", "creator__email")
+    autocomplete_fields = ["creator"]
+    readonly_fields = ["sample_links"]
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description="creator", ordering="creator__email")
+    def creator_link(self, obj):
+        return format_html(
+            '<a href="?{}={}">{}</a>',
+            CreatorFilter.parameter_name,
+            obj.creator_id,
+            obj.creator,
+        )
+
+    @admin.display(description="samples")
+    def sample_links(self, obj):
+        # Listed on pages of their own rather than inline, an entry may have many
+        if obj.pk is None:
+            return "-"
+        content_type = ContentType.objects.get_for_model(obj)
+        return format_html(
+            '<a href="{}?content_type__id__exact={}&object_id={}">{} samples</a>',
+            reverse("admin:eval_resultsample_changelist"),
+            content_type.pk,
+            obj.pk,
+            obj.samples.count(),
+        )
 
     @action_with_form(
         ChangeVisibilityForm,
         description="Change visibility for selected entries",
     )
     def change_visibility_action(self, request, queryset, data):
-        for entry in queryset:
-            entry.visibility = data["visibility"]
-            entry.save()
+        with transaction.atomic():
+            changed = queryset.update(visibility=data["visibility"])
+            # Queryset updates don't send the signals which invalidate cached entry ids
+            transaction.on_commit(bump_entries_version)
         self.message_user(
             request,
-            f"Visibility changed to {data['visibility']} for {queryset.count()} entries.",
+            f"Visibility changed to {data['visibility']} for {changed} entries.",
         )
 
     @action_with_form(
@@ -74,19 +131,43 @@ class ResultEntryAdmin(AdminActionFormsMixin, admin.ModelAdmin):
         filtered_data = {k: v for k, v in data.items() if v is not None}
 
         if filtered_data:
-            for entry in queryset:
-                for field, value in filtered_data.items():
-                    setattr(entry, field, value)
-                entry.save()
+            with transaction.atomic():
+                changed = queryset.update(**filtered_data)
+                transaction.on_commit(bump_entries_version)
 
             self.message_user(
                 request,
-                f"Changed metrics {filtered_data} for {queryset.count()} entries.",
+                f"Changed metrics {filtered_data} for {changed} entries.",
             )
         else:
-            self.message_user(request, f"No data has been changed.")
+            self.message_user(request, "No data has been changed.")
 
-    actions = [change_visibility_action, change_metrics_action]
+    actions = [
+        change_visibility_action,
+        change_metrics_action,
+        *export_actions(ENTRY_FIELDS, "entries"),
+    ]
+
+
+class ResultSampleAdmin(admin.ModelAdmin):
+    list_display = ["subpath", "entry_link", "width", "height", "file"]
+    list_select_related = ["content_type"]
+    ordering = ("content_type", "object_id", "subpath")
+    search_fields = ("subpath",)
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description="entry", ordering="object_id")
+    def entry_link(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse(
+                f"admin:{obj.content_type.app_label}_{obj.content_type.model}_change",
+                args=(obj.object_id,),
+            ),
+            obj.object_id,
+        )
 
 
 admin.site.register(ReconstructionEntry, ResultEntryAdmin)
+admin.site.register(ResultSample, ResultSampleAdmin)
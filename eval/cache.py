@@ -0,0 +1,244 @@
+import os
+import random
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .models import EntryStatus, EntryVisibility
+
+# Every process keeps its own copy of the cached id lists, a change to any entry
+# bumps the modification time of this file which invalidates all of them.
+VERSION_FILE = settings.DATABASE_DIR / "entries.version"
+
+
+def entries_version():
+    try:
+        return VERSION_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_entries_version():
+    # Ensure the version changes even if the clock did not tick since the last bump
+    version = max(time.time_ns(), entries_version() + 1)
+    VERSION_FILE.touch(exist_ok=True)
+    os.utime(VERSION_FILE, ns=(version, version))
+
+
+EntryAccess = namedtuple("EntryAccess", ["creator_id", "visibility", "is_active"])
+
+
+class EntryAccessCache:
+    """Bounded LRU cache of the fields needed to decide who may see an entry, keyed
+    by its uuid. Entries also expire after `ttl` seconds, and the whole cache is
+    dropped whenever any entry changes, so a decision is never based on stale data.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self.entries = OrderedDict()
+
+    def lookup(self, model, uuid):
+        """Returns the cache key and whether the entry is cached, with its EntryAccess."""
+        # The version must be read before querying, such that a change committed
+        # after the query will be seen on the next lookup
+        if (version := entries_version()) != self.version:
+            self.version = version
+            self.entries.clear()
+
+        key = (model._meta.label, uuid)
+        if (hit := self.entries.get(key)) is not None and hit[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            return key, True, hit[1]
+        return key, False, None
+
+    def store(self, key, row):
+        access = EntryAccess(*row) if row else None
+        self.entries[key] = (time.monotonic() + self.ttl, access)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return access
+
+    @staticmethod
+    def query(model, uuid):
+        return model.objects.filter(uuid=uuid).values_list(
+            "creator_id", "visibility", "is_active"
+        )
+
+    def get(self, model, uuid):
+        """Returns the EntryAccess of the entry with the given uuid, or None."""
+        key, cached, access = self.lookup(model, uuid)
+        if cached:
+            return access
+        return self.store(key, self.query(model, uuid).first())
+
+    async def aget(self, model, uuid):
+        """Async version of `get`, which only leaves the event loop on a miss."""
+        key, cached, access = self.lookup(model, uuid)
+        if cached:
+            return access
+        return self.store(key, await self.query(model, uuid).afirst())
+
+
+entry_access = EntryAccessCache()
+
+
+def sort_key(pk, value, descending):
+    return (-value, -pk) if descending else (value, pk)
+
+
+class OrderedIds:
+    """Entry ids in a fixed order together with their sort keys, such that the
+    neighbours of any position in the order can be found by bisection.
+
+    The ids and values are kept in arrays of 8 bytes per entry, sort keys are only
+    built for the positions that bisection looks at."""
+
+    def __init__(self, rows, descending=False):
+        # Rows of (pk, value) must already be ordered by (value, pk) in the given direction
+        self.sign = -1 if descending else 1
+        self.ids = array("q")
+        self.values = array("d")
+        for pk, value in rows:
+            self.ids.append(pk)
+            self.values.append(self.sign * value)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return self.ids[i]
+
+    def key(self, i):
+        """The sort key of position `i`, as returned by `sort_key`."""
+        return (self.values[i], self.sign * self.ids[i])
+
+    def neighbours(self, key):
+        """Returns the (key, id) pairs directly before and after `key`, or None."""
+        positions = range(len(self.ids))
+        i = bisect_left(positions, key, key=self.key)
+        j = bisect_right(positions, key, key=self.key)
+        before = (self.key(i - 1), self.ids[i - 1]) if i > 0 else None
+        after = (self.key(j), self.ids[j]) if j < len(self.ids) else None
+        return before, after
+
+    def ends(self):
+        if not self.ids:
+            return None, None
+        return (self.key(0), self.ids[0]), (self.key(-1), self.ids[-1])
+
+
+def ordered_entries(entries, order_by="pk"):
+    field = order_by.removeprefix("-")
+    descending = order_by.startswith("-")
+
+    if field != "pk":
+        # Entries without a value for the metric are not ranked, as on the leaderboard
+        entries = entries.exclude(**{field: -1.0}).exclude(**{f"{field}__isnull": True})
+    rows = entries.order_by(order_by, "-pk" if descending else "pk").values_list(
+        "pk", field
+    )
+    return OrderedIds(rows, descending=descending)
+
+
+class VisibleIdsCache:
+    """Ordered ids of the entries visible to each class of viewer, i.e. the public
+    (and anonymous) ones, and all of them for superusers, per ordering. Logged in
+    users additionally see their own private entries, which are few and not cached.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.ids = {}
+
+    def get(self, model, viewer_class, order_by="pk"):
+        if (version := entries_version()) != self.version:
+            self.version, self.ids = version, {}
+
+        key = (model._meta.label, viewer_class, order_by)
+        if key not in self.ids:
+            entries = model.objects.filter(
+                process_status=EntryStatus.SUCCESS, is_active=True
+            )
+            if viewer_class == "public":
+                entries = entries.filter(
+                    visibility__in=[EntryVisibility.PUBL, EntryVisibility.ANON]
+                )
+            self.ids[key] = ordered_entries(entries, order_by)
+        return self.ids[key]
+
+
+visible_ids = VisibleIdsCache()
+
+
+def get_visible_ids(request, model, order_by="pk"):
+    """Returns the cached ids visible to the request's viewer class, and the ids of
+    the user's own private entries which are disjoint from them."""
+    user = request.user
+
+    if user.is_superuser:
+        return visible_ids.get(model, "all", order_by), OrderedIds([])
+
+    own_ids = OrderedIds([])
+    if user.is_authenticated:
+        own_ids = ordered_entries(
+            model.objects.filter(
+                creator=user,
+                process_status=EntryStatus.SUCCESS,
+                is_active=True,
+                visibility=EntryVisibility.PRIV,
+            ),
+            order_by,
+        )
+    return visible_ids.get(model, "public", order_by), own_ids
+
+
+def sample_visible_pair(request, model):
+    """Returns the pks of two distinct entries visible to the request's user, drawn
+    uniformly at random, or None if there are less than two such entries."""
+    ids, own_ids = get_visible_ids(request, model)
+
+    # Both lists are disjoint so sampling indices into their concatenation is uniform
+    if len(ids) + len(own_ids) < 2:
+        return None
+    return tuple(
+        ids[i] if i < len(ids) else own_ids[i - len(ids)]
+        for i in random.sample(range(len(ids) + len(own_ids)), 2)
+    )
+
+
+def get_neighbours(request, entry, order_by="pk"):
+    """Returns the pks of the visible entries before and after `entry` in the given
+    ordering, wrapping around at either end."""
+    field = order_by.removeprefix("-")
+    value = getattr(entry, field)
+
+    # Entries that are not ranked by this metric are navigated by pk instead
+    if value is None or (field != "pk" and value == -1):
+        order_by, value = "pk", entry.pk
+
+    key = sort_key(entry.pk, value, order_by.startswith("-"))
+    befores, afters, firsts, lasts = [], [], [], []
+
+    for ids in get_visible_ids(request, type(entry), order_by):
+        before, after = ids.neighbours(key)
+        first, last = ids.ends()
+        befores.append(before)
+        afters.append(after)
+        firsts.append(first)
+        lasts.append(last)
+
+    # Closest neighbour across the cached and own ids, else wrap around
+    before = max(filter(None, befores), default=None) or max(
+        filter(None, lasts), default=None
+    )
+    after = min(filter(None, afters), default=None) or min(
+        filter(None, firsts), default=None
+    )
+    return (before[1] if before else None), (after[1] if after else None)
@@ -8,16 +8,13 @@ RESULTENTRY_NAME_MAX_LENGTH = 100
 MAX_UPLOAD_SIZE = 300 * 1024 * 1024
 MAX_UPLOAD_SIZE_STR = "350MB"
 MAX_UPLOADS_PER_DAY = 4
+MAX_UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+STALE_UPLOAD_HOURS = 24
 UPLOADS_ENABLED = ast.literal_eval(os.getenv("SPC_UPLOADS_ENABLED", "False"))
 
+# The ground truth files are listed in a manifest, see `manifest.get_eval_files`
 EVAL_DIRECTORY = Path(os.environ["SPC_EVALDIR"])
-EVAL_FILES = set(
-    str(p.relative_to(EVAL_DIRECTORY)) for p in EVAL_DIRECTORY.glob("**/*.png")
-)
 SAMPLE_FRAMES_DIRECTORY = Path("samples")
 
 UPLOAD_DIRECTORY = Path(os.environ["SPC_UPLOADDIR"])
-UPLOAD_DIRECTORY.mkdir(exist_ok=True, parents=True)
-
 MEDIA_DIRECTORY = Path(settings.MEDIA_ROOT)
-MEDIA_DIRECTORY.mkdir(exist_ok=True, parents=True)
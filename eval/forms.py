@@ -39,3 +39,9 @@ class EditResultEntryForm(forms.ModelForm):
     class Meta:
         model = ResultEntry
         fields = ["name", "visibility", "citation", "code_url"]
+
+
+class ChunkedUploadForm(forms.ModelForm):
+    class Meta:
+        model = ReconstructionEntry
+        fields = ["name", "visibility", "citation", "code_url"]
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rich.progress import track
+
+from ...models import ResultSample
+
+
+class Command(BaseCommand):
+    help = """
+    Fill in the subpath and image dimensions of result samples created before these
+    were stored in the database. Run once after migrating, it is safe to re-run.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Number of samples per update"
+        )
+
+    def handle(self, *args, **options):
+        samples = ResultSample.objects.filter(subpath="").prefetch_related("entry")
+        batch, updated, missing = [], 0, 0
+
+        for sample in track(
+            samples.iterator(chunk_size=options["batch_size"]), total=samples.count()
+        ):
+            sample.fill_subpath()
+            try:
+                sample.fill_dimensions()
+            except FileNotFoundError:
+                missing += 1
+            batch.append(sample)
+
+            if len(batch) >= options["batch_size"]:
+                updated += self.flush(batch)
+
+        updated += self.flush(batch)
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} samples."))
+
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Could not read dimensions of {missing} missing files."
+                )
+            )
+
+    @staticmethod
+    def flush(batch):
+        with transaction.atomic():
+            ResultSample.objects.bulk_update(batch, ["subpath", "width", "height"])
+        count = len(batch)
+        batch.clear()
+        return count
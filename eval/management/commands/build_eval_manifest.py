@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...constants import EVAL_DIRECTORY
+from ...manifest import (
+    MANIFEST_PATH,
+    build_manifest,
+    get_manifest,
+    get_manifest_errors,
+    get_sample_root,
+    save_manifest,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    List the ground truth frames with their dimensions, content hashes and whether
+    they are sample frames, in a manifest used by the website and evaluator instead
+    of scanning the dataset. Run after `collectstatic`, and re-run (then restart the
+    server) when the dataset or the sample frames change.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of frames hashed concurrently",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only check that the existing manifest matches the dataset",
+        )
+
+    def handle(self, *args, **options):
+        # Without the previews every frame would be scored, including the samples
+        if not (sample_root := get_sample_root()).is_dir():
+            raise CommandError(
+                f"No sample frames found in {sample_root}, run `collectstatic` first."
+            )
+
+        start = time.perf_counter()
+        frames = build_manifest(workers=options["workers"])
+        elapsed = time.perf_counter() - start
+
+        if not frames:
+            raise CommandError(f"No ground truth frames found in {EVAL_DIRECTORY}.")
+
+        if options["check"]:
+            if not MANIFEST_PATH.exists():
+                raise CommandError(f"No manifest found at {MANIFEST_PATH}.")
+            if errors := get_manifest_errors():
+                raise CommandError("\n".join(errors))
+            if (manifest := get_manifest()) != frames:
+                changed = sorted(
+                    name
+                    for name in manifest.keys() | frames.keys()
+                    if manifest.get(name) != frames.get(name)
+                )
+                raise CommandError(
+                    f"Manifest is out of date, {len(changed)} frames differ "
+                    f"(e.g. {changed[0]}). Re-run without --check."
+                )
+            self.stdout.write(self.style.SUCCESS("Manifest is up to date."))
+            return
+
+        save_manifest(frames)
+        samples = sum(frame.is_sample for frame in frames.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote manifest of {len(frames)} frames ({samples} samples) "
+                f"to {MANIFEST_PATH} in {elapsed:.1f}s."
+            )
+        )
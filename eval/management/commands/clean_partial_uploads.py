@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...constants import STALE_UPLOAD_HOURS
+from ...models import EntryStatus, ReconstructionEntry
+from ...uploads import PARTIAL_UPLOAD_DIRECTORY
+
+
+class Command(BaseCommand):
+    help = "Remove partial uploads that have not received any data in a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=STALE_UPLOAD_HOURS,
+            help="Age after which a partial upload is considered abandoned",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options["hours"] * 3600
+        removed = 0
+
+        # Resumable uploads which were started but never finalized
+        for entry in ReconstructionEntry.objects.filter(
+            process_status=EntryStatus.WAIT_UPL,
+            pub_date__lt=timezone.now() - timezone.timedelta(hours=options["hours"]),
+        ):
+            path = entry.partial_upload_path
+            if not path.exists() or path.stat().st_mtime < cutoff:
+                self.stdout.write(f"Removing abandoned upload for entry #{entry.id}.")
+                path.unlink(missing_ok=True)
+                entry.delete()
+                removed += 1
+
+        # Single request uploads left behind by a worker that died mid-request
+        if PARTIAL_UPLOAD_DIRECTORY.exists():
+            for path in PARTIAL_UPLOAD_DIRECTORY.iterdir():
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} partial uploads."))
@@ -1,8 +1,15 @@
+import os
 import random
+import struct
+import uuid
+import zlib
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 from rich.progress import (
     BarColumn,
@@ -14,7 +21,10 @@ from rich.progress import (
     TimeRemainingColumn,
 )
 
-from ...models import EntryStatus, EntryVisibility, ReconstructionEntry
+from ...cache import bump_entries_version
+from ...constants import MEDIA_DIRECTORY, SAMPLE_FRAMES_DIRECTORY
+from ...manifest import MANIFEST_PATH, PNG_SIGNATURE, get_manifest
+from ...models import EntryStatus, EntryVisibility, ReconstructionEntry, ResultSample
 
 # Taken from CROC FTP: https://github.com/schollz/croc
 WORDS = [  
@@ -170,56 +180,216 @@ class IterationSpeedColumn(ProgressColumn):
         return Text(f"{task.speed:.2f} it/s", style="progress.data.speed")
 
 
+# Roughly what the production database looks like: most entries were evaluated,
+# some were deleted by their creator
+STATUS_WEIGHTS = {
+    EntryStatus.SUCCESS: 90,
+    EntryStatus.FAIL: 6,
+    EntryStatus.WAIT_PROC: 3,
+    EntryStatus.WAIT_UPL: 1,
+}
+DELETED_FRACTION = 0.05
+
+
+def placeholder_png():
+    """A PNG of a single grey pixel."""
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        PNG_SIGNATURE
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\x80\x80\x80"))
+        + chunk(b"IEND", b"")
+    )
+
+
+def sample_frames():
+    """The (subpath, width, height) of the frames shown as samples, as in the static
+    sample directory, with their size from the ground truth manifest if there is one."""
+    root = (
+        settings.BASE_DIR
+        / "static"
+        / SAMPLE_FRAMES_DIRECTORY
+        / ReconstructionEntry.PREFIX
+    )
+    manifest = get_manifest() if MANIFEST_PATH.exists() else {}
+    frames = []
+    for path in sorted(root.glob("*/*.webp")):
+        subpath = str(path.relative_to(root).with_suffix(".png"))
+        frame = manifest.get(subpath)
+        frames.append((subpath, frame and frame.width, frame and frame.height))
+    return frames
+
+
 class Command(BaseCommand):
-    help = "Creates Users and Random Entries"
+    help = """
+    Creates users and random entries, e.g. to load test a database the size of
+    production. Entries are created in batches and spread over the users; evaluated
+    entries get all their metrics, and optionally sample rows and placeholder media
+    files. Runs with the same --seed create the same data.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument("count", type=int)
         parser.add_argument("--users", type=int, default=3)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Seed of the random data, for reproducible runs. Entries have random "
+            "uuids, so a seed can only be used once per database",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows inserted per query"
+        )
+        parser.add_argument(
+            "--days",
+            type=float,
+            default=365,
+            help="Entries are published at random over this many past days",
+        )
+        parser.add_argument(
+            "--samples",
+            action="store_true",
+            help="Create sample rows for evaluated entries",
+        )
+        parser.add_argument(
+            "--media",
+            action="store_true",
+            help="Also create placeholder files for the samples (implies --samples)",
+        )
 
-    def create_users(self, n=3):
-        for i in range(n):
-            usermail = f"user{i + 1}@test.test"
+    def create_users(self, n, batch_size):
+        """Returns the pks of users user1@test.test up to user<n>@test.test, creating
+        the ones that don't exist yet."""
+        User = get_user_model()
+        test_users = User.objects.filter(email__regex=r"^user[0-9]+@test\.test$")
+        emails = [f"user{i + 1}@test.test" for i in range(n)]
+        existing = set(test_users.values_list("email", flat=True))
 
-            try:
-                yield get_user_model().objects.get(email=usermail)
-            except ObjectDoesNotExist:
-                self.stdout.write(f"Created user {usermail}")
-                yield get_user_model().objects.create_user(
-                    email=usermail,
+        # All users get the same password, hashing it is slow
+        password = make_password("singlephotoncameras!")
+        missing = [email for email in emails if email not in existing]
+        User.objects.bulk_create(
+            [
+                User(
+                    email=email,
                     university="University of Testing",
-                    password="singlephotoncameras!",
+                    password=password,
                     is_verified=True,
                     is_active=True,
                 )
+                for email in missing
+            ],
+            batch_size=batch_size,
+        )
+        if missing:
+            self.stdout.write(f"Created {len(missing)} users")
+
+        pks = dict(test_users.values_list("email", "pk"))
+        return [pks[email] for email in emails]
+
+    @staticmethod
+    def make_entry(rng, creator_id, now, days):
+        status = rng.choices(list(STATUS_WEIGHTS), weights=STATUS_WEIGHTS.values())[0]
+        entry = ReconstructionEntry(
+            uuid=uuid.UUID(int=rng.getrandbits(128), version=4),
+            creator_id=creator_id,
+            name="-".join(rng.choices(WORDS, k=4)),
+            pub_date=now - timezone.timedelta(days=rng.uniform(0, days)),
+            visibility=rng.choice(EntryVisibility.values),
+            process_status=status,
+            md5sum=f"{rng.getrandbits(128):032x}",
+            is_active=rng.random() >= DELETED_FRACTION,
+            code_url=(
+                "https://singlephotonchallenge.com/" if rng.random() < 0.5 else None
+            ),
+        )
+
+        if status == EntryStatus.SUCCESS:
+            # Low percentiles are worse than the mean, i.e. lower PSNR and MS-SSIM,
+            # and higher LPIPS
+            entry.psnr_mean = rng.uniform(15, 40)
+            entry.psnr_5p = entry.psnr_mean - rng.uniform(1, 6)
+            entry.psnr_1p = entry.psnr_5p - rng.uniform(0, 4)
+            entry.ssim_mean = rng.uniform(0.3, 0.99)
+            entry.ssim_5p = entry.ssim_mean * rng.uniform(0.7, 1)
+            entry.ssim_1p = entry.ssim_5p * rng.uniform(0.7, 1)
+            entry.lpips_mean = rng.uniform(0.02, 0.7)
+            entry.lpips_5p = min(1, entry.lpips_mean * rng.uniform(1, 1.5))
+            entry.lpips_1p = min(1, entry.lpips_5p * rng.uniform(1, 1.3))
+        return entry
+
+    @staticmethod
+    def make_samples(entries, frames, content_type):
+        for entry in entries:
+            if entry.process_status != EntryStatus.SUCCESS:
+                continue
+            directory = entry.sample_directory.relative_to(MEDIA_DIRECTORY)
+            for subpath, width, height in frames:
+                yield ResultSample(
+                    content_type=content_type,
+                    object_id=entry.pk,
+                    file=str(directory / subpath),
+                    subpath=subpath,
+                    width=width,
+                    height=height,
+                )
+
+    @staticmethod
+    def write_media(samples, placeholder):
+        # Hard links to a single file, so that media takes no space
+        for sample in samples:
+            path = MEDIA_DIRECTORY / sample.file.name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(placeholder, path)
+            except FileExistsError:
+                pass
 
     def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        with_samples = options["samples"] or options["media"]
+        frames = sample_frames() if with_samples else []
+        content_type = ContentType.objects.get_for_model(ReconstructionEntry)
+
+        placeholder = MEDIA_DIRECTORY / ReconstructionEntry.PREFIX / "placeholder.png"
+        if options["media"]:
+            placeholder.parent.mkdir(parents=True, exist_ok=True)
+            placeholder.write_bytes(placeholder_png())
+
         with Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
             IterationSpeedColumn(),
             TimeRemainingColumn(elapsed_when_finished=True),
         ) as progress:
-            users = list(self.create_users(n=options["users"]))
+            users = self.create_users(options["users"], batch_size)
             task = progress.add_task("[cyan]Processing...", total=options["count"])
+            now = timezone.now()
 
-            for _ in range(options["count"]):
-                creator = random.choice(users)
-                methodname = "-".join(random.choices(WORDS, k=4))
-                entry = ReconstructionEntry.objects.create(
-                    creator=creator,
-                    name=methodname,
-                    pub_date=timezone.now(),
-                    visibility=random.choice(EntryVisibility.choices)[0],
-                    process_status=random.choice(EntryStatus.choices)[0],
-                    psnr_mean=random.uniform(0, 50),
-                    ssim_mean=random.uniform(0, 1),
-                    lpips_mean=random.uniform(0, 1),
-                    code_url=(
-                        "https://singlephotonchallenge.com/"
-                        if random.uniform(0, 1) < 0.5
-                        else None
-                    ),
-                )
-                entry.save()
-                progress.update(task, advance=1)
+            for start in range(0, options["count"], batch_size):
+                entries = [
+                    self.make_entry(rng, rng.choice(users), now, options["days"])
+                    for _ in range(min(batch_size, options["count"] - start))
+                ]
+                with transaction.atomic():
+                    # The pks of the new entries are set on SQLite
+                    ReconstructionEntry.objects.bulk_create(entries)
+                    samples = ResultSample.objects.bulk_create(
+                        self.make_samples(entries, frames, content_type),
+                        batch_size=batch_size,
+                    )
+                if options["media"]:
+                    self.write_media(samples, placeholder)
+                progress.update(task, advance=len(entries))
+
+        # Bulk creation doesn't send the signals which invalidate cached entry ids
+        bump_entries_version()
@@ -6,7 +6,8 @@ import imageio.v3 as iio
 import numpy as np
 import torch
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
 from rich.progress import track
 from torchmetrics.image import (
     LearnedPerceptualImagePatchSimilarity,
@@ -14,8 +15,16 @@ from torchmetrics.image import (
     PeakSignalNoiseRatio,
 )
 
-from ...constants import EVAL_DIRECTORY, SAMPLE_FRAMES_DIRECTORY, UPLOAD_DIRECTORY
-from ...models import EntryStatus, ReconstructionEntry, ResultSample
+from ...constants import EVAL_DIRECTORY, UPLOAD_DIRECTORY
+from ...manifest import get_manifest, get_manifest_errors
+from ...models import (
+    EntryStatus,
+    ReconstructionEntry,
+    ResultSample,
+    StorageKind,
+    StoredFile,
+)
+from ...storage import record_file, remove_file
 
 PSNR = PeakSignalNoiseRatio(data_range=(0, 1))
 MS_SSIM = MultiScaleStructuralSimilarityIndexMeasure(data_range=(0, 1))
@@ -34,21 +43,13 @@ class Command(BaseCommand):
 
     def evaluate_single(self, submission, description="Working..."):
         metrics = []
+        manifest = get_manifest()
 
         with ZipFile(submission.upload_path) as zipf:
             files = list(filter(lambda name: name.endswith(".png"), zipf.namelist()))
 
             for p in track(files, description=description):
-                root = (
-                    settings.BASE_DIR / "static"
-                    if settings.DEBUG
-                    else settings.STATIC_ROOT
-                )
-                if (
-                    (root / SAMPLE_FRAMES_DIRECTORY / ReconstructionEntry.PREFIX / p)
-                    .with_suffix(".webp")
-                    .exists()
-                ):
+                if manifest[p].is_sample:
                     # These frames will be shown to the user to allow for qualitative
                     # comparisons with the test set. Since we will leak some of the test
                     # set because of this, we DO NOT calculate test metrics on these samples.
@@ -60,7 +61,13 @@ class Command(BaseCommand):
                         sample = ResultSample.objects.get(file=str(file))
                         assert sample.entry.pk == submission.pk
                     except ResultSample.DoesNotExist:
-                        ResultSample(file=str(file), entry=submission).save()
+                        sample = ResultSample(file=str(file), entry=submission)
+                    sample.subpath = p
+                    sample.fill_dimensions()
+                    sample.save()
+                    record_file(
+                        submission, StorageKind.SAMPLE, submission.sample_directory / p
+                    )
                 else:
                     with zipf.open(p) as f:
                         pred = self.load_img(f)
@@ -88,18 +95,23 @@ class Command(BaseCommand):
         # Don't use too many threads or the server will DDoS itself
         torch.set_num_threads(int(os.getenv("SPC_NUM_THREADS", "1")))
 
+        # A stale manifest would score sample frames, or never extract them
+        if errors := get_manifest_errors():
+            raise CommandError("\n".join(errors))
+
         submissions = ReconstructionEntry.objects.filter(
             process_status=EntryStatus.WAIT_PROC, is_active=True
         )
         submission_ids = set(submissions.values_list("id", flat=True))
-        archives = set(UPLOAD_DIRECTORY.glob("**/*.zip"))
 
-        if set(sub.upload_path for sub in submissions) != archives:
+        # Only the archives of pending entries are checked, orphaned archives are
+        # found by the `storage_gc` command
+        missing = [sub for sub in submissions if not sub.upload_path.exists()]
+        if missing:
             self.stdout.write(
                 self.style.WARNING(
-                    "Found mismatch between uploaded archives and database entries waiting for processing!\n"
-                    f"Uploaded Archives: {[str(p.relative_to(UPLOAD_DIRECTORY)) for p in sorted(archives)]}\n\n"
-                    f"Database Entries: {sorted(str(sub.upload_path.relative_to(UPLOAD_DIRECTORY)) for sub in submissions)}"
+                    "Found database entries waiting for processing without an uploaded archive!\n"
+                    f"Database Entries: {sorted(str(sub.upload_path.relative_to(UPLOAD_DIRECTORY)) for sub in missing)}"
                 )
             )
 
@@ -110,23 +122,27 @@ class Command(BaseCommand):
                 )
                 submission.process_status = EntryStatus.SUCCESS
                 submission.save()
+                remove_file(StorageKind.UPLOAD, submission.upload_path)
             except Exception:
                 self.stdout.write(self.style.ERROR(traceback.format_exc()))
                 submission.process_status = EntryStatus.FAIL
                 submission.save()
 
-        # Delete all successful uploads
-        for submission in ReconstructionEntry.objects.filter(
-            process_status=EntryStatus.SUCCESS
+        # Delete the uploads of entries which were evaluated before, but kept, e.g. by
+        # an interrupted run. The ledger only holds the uploads of a few entries.
+        for stored in StoredFile.objects.filter(
+            kind=StorageKind.UPLOAD,
+            content_type=ContentType.objects.get_for_model(ReconstructionEntry),
+            object_id__in=ReconstructionEntry.objects.filter(
+                process_status=EntryStatus.SUCCESS
+            ).values("pk"),
         ):
-            if submission.upload_path.exists():
-                if submission.id not in submission_ids:
-                    self.stdout.write(
-                        self.style.NOTICE(
-                            f"Deleting upload for previously successfully submission (id #{submission.id})."
-                        )
-                    )
-                submission.upload_path.unlink(missing_ok=True)
+            self.stdout.write(
+                self.style.NOTICE(
+                    f"Deleting upload for previously successfully submission (id #{stored.object_id})."
+                )
+            )
+            remove_file(StorageKind.UPLOAD, stored.full_path)
 
         # Output stats only for those we've evaluated
         # Note: We need to re-fetch all submissions as they have potentially changed!
@@ -0,0 +1,30 @@
+from core.exports import ENTRY_FIELDS, ExportCommand
+
+from ...models import EntryStatus, ReconstructionEntry
+
+
+class Command(ExportCommand):
+    help = "Export reconstruction entries with their metrics as CSV or NDJSON, streamed in chunks."
+
+    fields = ENTRY_FIELDS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--status",
+            choices=EntryStatus.values,
+            help="Only export entries with this processing status",
+        )
+        parser.add_argument(
+            "--include-deleted",
+            action="store_true",
+            help="Also export entries that were deleted by their creator",
+        )
+
+    def get_queryset(self, status=None, include_deleted=False, **options):
+        entries = ReconstructionEntry.objects.all()
+        if status:
+            entries = entries.filter(process_status=status)
+        if not include_deleted:
+            entries = entries.filter(is_active=True)
+        return entries
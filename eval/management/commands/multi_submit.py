@@ -1,23 +1,94 @@
+import errno
+import fcntl
 import hashlib
 import json
+import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 from rich.progress import track
 
-from ...models import EntryStatus, EntryVisibility, ReconstructionEntry
+from ...cache import bump_entries_version
+from ...manifest import get_archive_errors
+from ...models import (
+    EntryStatus,
+    EntryVisibility,
+    ReconstructionEntry,
+    StorageKind,
+    StoredFile,
+)
+from ...storage import stored_file
+
+# Linux ioctl which makes a file share the blocks of another (a reflink), on file
+# systems that support it such as btrfs and XFS
+FICLONE = 0x40049409
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def md5sum(path):
+    with open(path, "rb") as f:
+        file_hash = hashlib.md5()
+        while chunk := f.read(BUFFER_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def validate(path):
+    if not path.is_file():
+        return path, [f"{path} does not exist."]
+    return path, get_archive_errors(path)
+
+
+def place(source, destination, link=True):
+    """Puts a copy of `source` at `destination`, as a hard link if both are on the
+    same file system, else as a reflink or a plain copy. Returns how it was placed."""
+    if link:
+        try:
+            os.link(source, destination)
+            return "linked"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return "reflinked"
+    except OSError:
+        # Copied within the kernel where possible, see shutil.copyfile
+        shutil.copyfile(source, destination)
+        return "copied"
 
 
 class Command(BaseCommand):
-    help = "A batch submit utility"
+    help = """
+    A batch submit utility. All archives are validated like uploads and hashed in
+    parallel first, then put in the upload directory and their entries created in a
+    single transaction. Nothing is submitted if any archive is invalid.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument("config", type=str)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(8, os.cpu_count() or 1),
+            help="Number of archives validated, hashed and copied at a time",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Always copy the archives, instead of hard linking them when the "
+            "upload directory is on the same file system",
+        )
 
     @contextmanager
     def get_user(self, email="uploader@test.test"):
@@ -38,30 +109,97 @@ class Command(BaseCommand):
         user.is_active = False
         user.save()
 
-    @staticmethod
-    def md5sum(path):
-        with open(path, "rb") as f:
-            file_hash = hashlib.md5()
-            while chunk := f.read(8192):
-                file_hash.update(chunk)
-        return file_hash.hexdigest()
+    def load_config(self, conf_path):
+        with open(conf_path, "r") as f:
+            config = json.load(f)
+
+        submissions = []
+        for submission in config:
+            if (
+                visibility := submission.get("visibility")
+            ) is not None and visibility not in EntryVisibility.values:
+                raise CommandError(
+                    f"Invalid visibility {visibility!r}, expected one of "
+                    f"{', '.join(EntryVisibility.values)}."
+                )
+            path = Path(conf_path).parent / submission.pop("path")
+            submissions.append((path, submission))
+        return submissions
 
     def handle(self, *args, **options):
-        with open(conf_path := options["config"], "r") as f:
-            config = json.load(f)
+        submissions = self.load_config(options["config"])
+        paths = [path for path, _ in submissions]
 
-        with self.get_user() as user:
-            for submission in track(config):
-                if visibility := submission.get("visibility"):
-                    assert visibility in [value for value, _ in EntryVisibility.choices]
-
-                path = Path(conf_path).parent / submission.pop("path")
-                entry = ReconstructionEntry(
-                    creator=user,
-                    pub_date=timezone.now(),
-                    process_status=EntryStatus.WAIT_PROC,
-                    md5sum=self.md5sum(path),
-                    **submission,
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            errors = {
+                path: problems
+                for path, problems in track(
+                    executor.map(validate, paths),
+                    total=len(paths),
+                    description="Validating...",
                 )
-                shutil.copy(path, entry.upload_path)
-                entry.save()
+                if problems
+            }
+            if errors:
+                for path, problems in errors.items():
+                    self.stderr.write(self.style.ERROR(f"{path}:"))
+                    for problem in problems:
+                        self.stderr.write(f"  {problem}")
+                raise CommandError(
+                    f"{len(errors)} of {len(paths)} archives are invalid, nothing was submitted."
+                )
+
+            md5sums = list(executor.map(md5sum, paths))
+
+            with self.get_user() as user:
+                now = timezone.now()
+                entries = [
+                    ReconstructionEntry(
+                        creator=user,
+                        pub_date=now,
+                        process_status=EntryStatus.WAIT_PROC,
+                        md5sum=checksum,
+                        **submission,
+                    )
+                    for (_, submission), checksum in zip(submissions, md5sums)
+                ]
+                for entry in entries:
+                    entry.make_upload_directory()
+
+                # The archives must be in place before the evaluator can see the entries
+                try:
+                    methods = list(
+                        track(
+                            executor.map(
+                                lambda args: place(*args, link=not options["copy"]),
+                                [
+                                    (path, entry.upload_path)
+                                    for path, entry in zip(paths, entries)
+                                ],
+                            ),
+                            total=len(entries),
+                            description="Copying...",
+                        )
+                    )
+                    with transaction.atomic():
+                        ReconstructionEntry.objects.bulk_create(entries)
+                        StoredFile.objects.bulk_create(
+                            stored_file(entry, StorageKind.UPLOAD, entry.upload_path)
+                            for entry in entries
+                        )
+                except BaseException:
+                    # The entries have new uuids, so these are only the archives placed above
+                    for entry in entries:
+                        entry.upload_path.unlink(missing_ok=True)
+                    raise
+
+        # Bulk creation doesn't send the signals which invalidate cached entry ids
+        bump_entries_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Submitted {len(entries)} entries ("
+                + ", ".join(f"{methods.count(m)} {m}" for m in sorted(set(methods)))
+                + ")."
+            )
+        )
@@ -1,32 +1,63 @@
 import csv
+import itertools
 import json
 import os
+from pathlib import Path
 
+import numpy as np
 from django.core.management.base import BaseCommand, CommandError
 from django.urls import reverse
 
-from ...models import EntryStatus, ReconstructionEntry
+from ...ranking import METRICS, rank_entries, stability
 
 
 class Command(BaseCommand):
     help = """
     Rank submissions based on metrics and output to CSV.
     This is *not* what determines the official ranking of competition entries.
+
+    Several weights files and PSNR bounds can be given, entries are then ranked for
+    every combination of weights and (min, max) PSNR range, each written to its own
+    CSV, along with a report of how stable every entry's rank is across them.
     """
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "--weights", type=str, required=True, help="Path to JSON file with weights"
+            "--weights",
+            type=str,
+            nargs="+",
+            required=True,
+            help="Path(s) to JSON file(s) with weights",
         )
         parser.add_argument(
-            "--min_psnr", type=float, required=True, help="Minimum PSNR for scaling"
+            "--min_psnr",
+            type=float,
+            nargs="+",
+            required=True,
+            help="Minimum PSNR(s) for scaling",
         )
         parser.add_argument(
-            "--max_psnr", type=float, required=True, help="Maximum PSNR for scaling"
+            "--max_psnr",
+            type=float,
+            nargs="+",
+            required=True,
+            help="Maximum PSNR(s) for scaling",
         )
         parser.add_argument(
             "--output", type=str, default="rankings.csv", help="Output CSV filename"
         )
+        parser.add_argument(
+            "--stability_output",
+            type=str,
+            default="rank_stability.csv",
+            help="Output CSV filename of the rank stability report, if there are several configurations",
+        )
+        parser.add_argument(
+            "--top_k",
+            type=int,
+            default=10,
+            help="Rank up to which an entry counts as top ranked in the stability report",
+        )
         parser.add_argument(
             "--base_url",
             type=str,
@@ -34,94 +65,127 @@ class Command(BaseCommand):
             help="Base URL for eval links",
         )
 
-    def handle(self, *args, **options):
-        # Metrics we require in the weights file
-        metrics = [
-            "psnr_mean",
-            "psnr_5p",
-            "psnr_1p",
-            "ssim_mean",
-            "ssim_5p",
-            "ssim_1p",
-            "lpips_mean",
-            "lpips_5p",
-            "lpips_1p",
-        ]
-
-        min_p = options["min_psnr"]
-        max_p = options["max_psnr"]
-
-        entries = ReconstructionEntry.objects.filter(
-            process_status=EntryStatus.SUCCESS, is_active=True
-        )
-
+    def load_weights(self, path):
         # Load and validate weights
-        if not os.path.exists(options["weights"]):
-            raise CommandError(f"Weights file {options['weights']} does not exist.")
+        if not os.path.exists(path):
+            raise CommandError(f"Weights file {path} does not exist.")
 
         try:
-            with open(options["weights"], "r") as f:
+            with open(path, "r") as f:
                 weights = json.load(f)
         except json.JSONDecodeError:
-            raise CommandError(
-                f"Weights file {options['weights']} is not a valid JSON file."
-            )
+            raise CommandError(f"Weights file {path} is not a valid JSON file.")
 
         total_weight = sum(weights.values())
         if total_weight <= 0:
             raise CommandError("Sum of weights must be positive.")
 
         # Check for missing metrics
-        missing = [m for m in metrics if m not in weights]
+        missing = [m for m in METRICS if m not in weights]
         if missing:
             raise CommandError(f"Missing weights for metrics: {', '.join(missing)}")
+        return [weights[m] for m in METRICS], total_weight
+
+    def write_ranking(self, path, ranked, config, links):
+        with open(path, "w", newline="") as csvfile:
+            fieldnames = [
+                "Account email",
+                "Submission id",
+                "Evaluation link",
+                "Final score",
+            ]
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
 
-        def scale_psnr(val):
-            if val is None or val < 0:
-                return 0.0
-            return max(0.0, min(1.0, (val - min_p) / (max_p - min_p)))
-
-        def norm_val(val):
-            if val is None or val < 0:
-                return 0.0
-            return max(0.0, min(1.0, val))
-
-        def norm_lpips(val):
-            if val is None or val < 0:
-                return 0.0
-            return max(0.0, min(1.0, 1.0 - val))
-
-        def score_entry(entry):
-            score = (
-                weights["psnr_mean"] * scale_psnr(entry.psnr_mean)
-                + weights["psnr_5p"] * scale_psnr(entry.psnr_5p)
-                + weights["psnr_1p"] * scale_psnr(entry.psnr_1p)
-                + weights["ssim_mean"] * norm_val(entry.ssim_mean)
-                + weights["ssim_5p"] * norm_val(entry.ssim_5p)
-                + weights["ssim_1p"] * norm_val(entry.ssim_1p)
-                + weights["lpips_mean"] * norm_lpips(entry.lpips_mean)
-                + weights["lpips_5p"] * norm_lpips(entry.lpips_5p)
-                + weights["lpips_1p"] * norm_lpips(entry.lpips_1p)
+            # Sort by score descending
+            for i in np.argsort(ranked.ranks[config]):
+                writer.writerow(
+                    {
+                        "Account email": ranked.emails[i],
+                        "Submission id": ranked.uuids[i],
+                        "Evaluation link": links[i],
+                        "Final score": ranked.scores[config, i],
+                    }
+                )
+
+    def write_stability(self, path, ranked, top_k, links):
+        report = stability(ranked.ranks, top_k)
+        mean_scores = ranked.scores.mean(axis=0)
+        order = np.lexsort((report["median_rank"], -report["top_k_rate"]))
+
+        with open(path, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(
+                [
+                    "Account email",
+                    "Submission id",
+                    "Evaluation link",
+                    f"Top {top_k} rate",
+                    "Best rank",
+                    "Median rank",
+                    "Worst rank",
+                    "Mean score",
+                ]
             )
-            eval_link = f"{options['base_url']}{reverse('eval:detail', args=[entry.pk])}"
+            for i in order:
+                writer.writerow(
+                    [
+                        ranked.emails[i],
+                        ranked.uuids[i],
+                        links[i],
+                        report["top_k_rate"][i],
+                        report["best_rank"][i],
+                        report["median_rank"][i],
+                        report["worst_rank"][i],
+                        mean_scores[i],
+                    ]
+                )
 
-            return {
-                "Account email": entry.creator.email,
-                "Submission id": str(entry.uuid),
-                "Evaluation link": eval_link,
-                "Final score": score / total_weight,
-            }
-
-        # Sort by score descending and save to CSV
-        rankings = [score_entry(entry) for entry in entries]
-        rankings.sort(key=lambda x: x["Final score"], reverse=True)
+    def handle(self, *args, **options):
+        weights, totals = zip(*(self.load_weights(path) for path in options["weights"]))
+        psnr_ranges = [
+            (min_p, max_p)
+            for min_p, max_p in itertools.product(
+                options["min_psnr"], options["max_psnr"]
+            )
+            if min_p < max_p
+        ]
+        if not psnr_ranges:
+            raise CommandError("Minimum PSNR must be less than maximum PSNR.")
+
+        # Scores of all configurations, ordered by weights file then PSNR range
+        ranked = rank_entries(weights, totals, psnr_ranges)
+        names = [Path(path).stem for path in options["weights"]]
+        if len(set(names)) < len(names):
+            # Tell weights files of the same name apart by their position
+            names = [f"{i}-{name}" for i, name in enumerate(names, 1)]
+        configs = list(itertools.product(names, psnr_ranges))
+        links = [
+            f"{options['base_url']}{reverse('eval:detail', args=[pk])}"
+            for pk in ranked.pks.tolist()
+        ]
 
-        with open(options["output"], "w", newline="") as csvfile:
-            fieldnames = ["Account email", "Submission id", "Evaluation link", "Final score"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+        if len(configs) == 1:
+            self.write_ranking(options["output"], ranked, 0, links)
+            self.stdout.write(
+                self.style.SUCCESS(f"Rankings saved to {options['output']}")
+            )
+            return
 
-            for rank in rankings:
-                writer.writerow(rank)
+        output = Path(options["output"])
+        for config, (name, (min_p, max_p)) in enumerate(configs):
+            path = output.with_name(
+                f"{output.stem}_{name}_{min_p:g}-{max_p:g}{output.suffix}"
+            )
+            self.write_ranking(path, ranked, config, links)
+            self.stdout.write(f"Rankings saved to {path}")
 
-        self.stdout.write(self.style.SUCCESS(f"Rankings saved to {options['output']}"))
+        self.write_stability(
+            options["stability_output"], ranked, options["top_k"], links
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked {len(ranked.pks)} entries under {len(configs)} configurations, "
+                f"rank stability saved to {options['stability_output']}"
+            )
+        )
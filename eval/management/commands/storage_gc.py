@@ -0,0 +1,229 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import batched
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from ...models import (
+    EntryStatus,
+    ReconstructionEntry,
+    ResultSample,
+    StorageKind,
+    StoredFile,
+)
+from ...storage import entry_uuid, scan_files
+
+BATCH_SIZE = 500
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f}{unit}"
+
+
+class Command(BaseCommand):
+    help = """
+    Reconcile the storage ledger with the upload and media directories, which are
+    scanned in parallel. Ledger rows of missing files are removed, and files of
+    existing entries which were not recorded (e.g. written before the ledger existed)
+    are added. Reports the files that can be reclaimed: uploads of evaluated entries,
+    uploads and samples of failed and deleted entries, and files which belong to no
+    entry. These are only removed with `--delete`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Remove the reclaimable files, and the samples rows of removed files",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=24,
+            help="Hours since a file was last modified before it may be reclaimed, "
+            "files that are newer may still be in the process of being recorded",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=8, help="Directories read at a time"
+        )
+
+    def scan(self, workers):
+        """Returns the stat result of every file on disk by (kind, path)."""
+        disk = {}
+        for kind in StorageKind:
+            directory = kind.root / ReconstructionEntry.PREFIX
+            # Partial uploads are removed by `clean_partial_uploads`
+            files = scan_files(directory, workers, skip_suffixes=(".part",))
+            prefix = directory.relative_to(kind.root)
+            disk.update(
+                {(kind.value, str(prefix / path)): st for path, st in files.items()}
+            )
+        return disk
+
+    def adopt(self, untracked, disk):
+        """Adds untracked files of existing entries to the ledger, returns the rest."""
+        by_uuid = {}
+        for key in untracked:
+            by_uuid.setdefault(entry_uuid(key[1]), []).append(key)
+        orphans = by_uuid.pop(None, [])
+
+        content_type = ContentType.objects.get_for_model(ReconstructionEntry)
+        adopted = []
+        for uuids in batched(by_uuid, BATCH_SIZE):
+            pks = dict(
+                ReconstructionEntry.objects.filter(uuid__in=uuids).values_list(
+                    "uuid", "pk"
+                )
+            )
+            for uuid in uuids:
+                if uuid not in pks:
+                    orphans.extend(by_uuid[uuid])
+                    continue
+                adopted.extend(
+                    StoredFile(
+                        content_type=content_type,
+                        object_id=pks[uuid],
+                        kind=kind,
+                        path=path,
+                        size=disk[kind, path].st_size,
+                    )
+                    for kind, path in by_uuid[uuid]
+                )
+
+        StoredFile.objects.bulk_create(
+            adopted, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        return len(adopted), orphans
+
+    def reclaimable(self):
+        """Returns the ledger rows of files which are no longer needed, by reason."""
+        entries = ReconstructionEntry.objects.all()
+        stored = StoredFile.objects.filter(
+            content_type=ContentType.objects.get_for_model(ReconstructionEntry)
+        ).only("kind", "path")
+        return {
+            "uploads of evaluated entries": stored.filter(
+                kind=StorageKind.UPLOAD,
+                object_id__in=entries.filter(
+                    process_status=EntryStatus.SUCCESS, is_active=True
+                ).values("pk"),
+            ),
+            "files of failed entries": stored.filter(
+                object_id__in=entries.filter(
+                    process_status=EntryStatus.FAIL, is_active=True
+                ).values("pk")
+            ),
+            "files of deleted entries": stored.filter(
+                object_id__in=entries.filter(is_active=False).values("pk")
+            ),
+            "files of removed entries": stored.filter(
+                ~Q(object_id__in=entries.values("pk"))
+            ),
+        }
+
+    def remove(self, keys, workers):
+        """Deletes files, their ledger rows and the sample rows that point at them."""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(
+                lambda key: (StorageKind(key[0]).root / key[1]).unlink(missing_ok=True),
+                keys,
+            ):
+                pass
+
+        samples = [path for kind, path in keys if kind == StorageKind.SAMPLE]
+        for batch in batched(keys, BATCH_SIZE):
+            with transaction.atomic():
+                for kind in StorageKind:
+                    StoredFile.objects.filter(
+                        kind=kind, path__in=[path for k, path in batch if k == kind]
+                    ).delete()
+        for batch in batched(samples, BATCH_SIZE):
+            ResultSample.objects.filter(file__in=batch).delete()
+
+        # Remove the sample directories which are now empty
+        for directory in sorted(
+            {(StorageKind.SAMPLE.root / path).parent for path in samples},
+            key=lambda d: len(d.parts),
+            reverse=True,
+        ):
+            while directory != StorageKind.SAMPLE.root:
+                try:
+                    directory.rmdir()
+                except OSError:
+                    break
+                directory = directory.parent
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options["min_age"] * 3600
+
+        start = time.perf_counter()
+        disk = self.scan(options["workers"])
+        self.stdout.write(
+            f"Scanned {len(disk)} files ({format_size(sum(st.st_size for st in disk.values()))}) "
+            f"in {time.perf_counter() - start:.1f}s."
+        )
+
+        ledger = {
+            (kind, path): pk
+            for pk, kind, path in StoredFile.objects.values_list(
+                "pk", "kind", "path"
+            ).iterator(chunk_size=BATCH_SIZE * 10)
+        }
+
+        # Rows of files which are gone, e.g. removed by hand
+        stale = [pk for key, pk in ledger.items() if key not in disk]
+        for batch in batched(stale, BATCH_SIZE):
+            StoredFile.objects.filter(pk__in=batch).delete()
+
+        # Recently written files may not have been recorded yet
+        untracked = [
+            key
+            for key, st in disk.items()
+            if key not in ledger and st.st_mtime < cutoff
+        ]
+        adopted, orphans = self.adopt(untracked, disk)
+        self.stdout.write(
+            f"Ledger: {len(ledger) - len(stale)} files recorded, {len(stale)} missing "
+            f"files removed, {adopted} untracked files added."
+        )
+
+        categories = {
+            reason: [
+                (kind, path)
+                for kind, path in rows.values_list("kind", "path").iterator()
+                if (kind, path) in disk and disk[kind, path].st_mtime < cutoff
+            ]
+            for reason, rows in self.reclaimable().items()
+        }
+        categories["files of no entry"] = orphans
+
+        reclaimable = []
+        for reason, keys in categories.items():
+            size = sum(disk[key].st_size for key in keys)
+            self.stdout.write(f"  {len(keys):>8} {reason} ({format_size(size)})")
+            reclaimable.extend(keys)
+        size = format_size(sum(disk[key].st_size for key in reclaimable))
+
+        if not reclaimable:
+            self.stdout.write(self.style.SUCCESS("Nothing to reclaim."))
+            return
+        if not options["delete"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(reclaimable)} files ({size}) can be reclaimed, run with "
+                    "--delete to remove them."
+                )
+            )
+            return
+
+        self.remove(reclaimable, options["workers"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Reclaimed {len(reclaimable)} files ({size}).")
+        )
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import lzma
+import os
+import struct
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from zipfile import BadZipFile, ZipFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .constants import EVAL_DIRECTORY, SAMPLE_FRAMES_DIRECTORY
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = {
+    0: "grayscale",
+    2: "RGB",
+    3: "palette",
+    4: "grayscale+alpha",
+    6: "RGBA",
+}
+
+# Frames are loaded by the evaluator as 8-bit images of which the first three channels are used
+VALID_COLOR_TYPES = {2, 6}
+VALID_BIT_DEPTH = 8
+
+# Number of zip members whose headers are read concurrently
+PREFLIGHT_WORKERS = 8
+
+# Listing of the ground truth written by the `build_eval_manifest` command, such
+# that no process needs to scan the dataset
+MANIFEST_PATH = settings.DATABASE_DIR / "eval_manifest.json"
+
+PngHeader = namedtuple("PngHeader", ["width", "height", "bit_depth", "color_type"])
+Frame = namedtuple(
+    "Frame", ["width", "height", "bit_depth", "color_type", "md5sum", "is_sample"]
+)
+
+
+def read_png_header(f):
+    """Parses the IHDR chunk at the start of a PNG file, only reading its first 33
+    bytes. Returns a PngHeader, or None if this is not a PNG."""
+    data = f.read(33)
+    if len(data) < 33 or data[:8] != PNG_SIGNATURE or data[12:16] != b"IHDR":
+        return None
+    return PngHeader(*struct.unpack(">IIBB", data[16:26]))
+
+
+def get_sample_root(prefix="reconstruction"):
+    """Directory of the sample frame previews, which differs between DEBUG (the
+    source static files) and production (the collected ones)."""
+    root = settings.BASE_DIR / "static" if settings.DEBUG else settings.STATIC_ROOT
+    return root / SAMPLE_FRAMES_DIRECTORY / prefix
+
+
+def get_sample_frames():
+    """Paths of the sample frames, relative to `EVAL_DIRECTORY`. These are shown to
+    users to allow for qualitative comparisons, so no metrics are computed on them."""
+    root = get_sample_root()
+    return frozenset(
+        str(p.relative_to(root).with_suffix(".png")) for p in root.glob("**/*.webp")
+    )
+
+
+def describe_frame(name, samples):
+    md5sum = hashlib.md5()
+    with open(EVAL_DIRECTORY / name, "rb") as f:
+        header = read_png_header(f)
+        f.seek(0)
+        while chunk := f.read(1024 * 1024):
+            md5sum.update(chunk)
+
+    if header is None:
+        raise ValueError(f"Ground truth frame {name} is not a PNG file.")
+    return Frame(*header, md5sum.hexdigest(), name in samples)
+
+
+def build_manifest(workers=8):
+    """Scans the ground truth directory, returns a dict mapping the path of every
+    frame (relative to `EVAL_DIRECTORY`) to its Frame."""
+    names = sorted(
+        str(p.relative_to(EVAL_DIRECTORY)) for p in EVAL_DIRECTORY.glob("**/*.png")
+    )
+    samples = get_sample_frames()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(
+            zip(names, executor.map(lambda name: describe_frame(name, samples), names))
+        )
+
+
+def save_manifest(frames, path=MANIFEST_PATH):
+    data = {
+        "eval_directory": str(EVAL_DIRECTORY),
+        "sample_root": str(get_sample_root()),
+        "frames": {name: frame._asdict() for name, frame in frames.items()},
+    }
+    # Replace atomically, other processes may be loading the manifest
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data, indent=1))
+    os.replace(tmp_path, path)
+
+
+@cache
+def load_manifest():
+    """Returns the manifest as saved by `save_manifest`, loaded once per process.
+    Only the `build_eval_manifest` command scans the dataset to build it."""
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        raise ImproperlyConfigured(
+            f"No ground truth manifest at {MANIFEST_PATH}, "
+            "run `python manage.py build_eval_manifest`."
+        ) from None
+
+
+@cache
+def get_manifest():
+    """Returns a dict mapping the path of every ground truth frame (relative to
+    `EVAL_DIRECTORY`) to its Frame."""
+    return {name: Frame(**frame) for name, frame in load_manifest()["frames"].items()}
+
+
+def get_manifest_errors():
+    """Checks that the manifest was built for the current dataset and sample frames,
+    which the evaluator relies on to know which frames to score. Returns the lines of
+    an error message, or an empty list."""
+    data = load_manifest()
+    errors = [
+        f"The manifest was built for {key} {data.get(key)}, but it is {current}."
+        for key, current in [
+            ("eval_directory", EVAL_DIRECTORY),
+            ("sample_root", get_sample_root()),
+        ]
+        if data.get(key) != str(current)
+    ]
+    if not errors:
+        # Listing the sample previews is cheap, unlike scanning the dataset
+        manifest = get_manifest()
+        samples = {name for name, frame in manifest.items() if frame.is_sample}
+        if changed := samples ^ (get_sample_frames() & manifest.keys()):
+            errors.append(
+                f"The sample frames changed since the manifest was built, "
+                f'{len(changed)} differ (e.g. "{min(changed)}").'
+            )
+    if errors:
+        errors.append("Re-run `python manage.py build_eval_manifest`.")
+    return errors
+
+
+@cache
+def get_eval_files():
+    """Paths of all ground truth frames, relative to `EVAL_DIRECTORY`."""
+    return frozenset(get_manifest())
+
+
+def describe_header(header):
+    return (
+        f"{header.bit_depth}-bit {PNG_COLOR_TYPES.get(header.color_type, 'unknown')} "
+        f"{header.width}x{header.height}"
+    )
+
+
+def check_frame(zipf, name, expected):
+    """Returns a description of what's wrong with a submitted frame, or None."""
+    # Each decompressor raises its own errors on corrupt data, bz2 an OSError
+    try:
+        with zipf.open(name) as f:
+            header = read_png_header(f)
+    except (
+        BadZipFile,
+        NotImplementedError,
+        RuntimeError,
+        EOFError,
+        OSError,
+        zlib.error,
+        lzma.LZMAError,
+    ):
+        return f'"{name}" could not be read from the archive.'
+
+    if header is None:
+        return f'"{name}" is not a valid PNG file.'
+    if (
+        header.bit_depth != VALID_BIT_DEPTH
+        or header.color_type not in VALID_COLOR_TYPES
+    ):
+        return f'"{name}" must be an 8-bit RGB or RGBA PNG, got a {describe_header(header)} image.'
+    if (header.width, header.height) != (expected.width, expected.height):
+        return (
+            f'"{name}" has a resolution of {header.width}x{header.height}, '
+            f"expected {expected.width}x{expected.height}."
+        )
+    return None
+
+
+def get_frame_errors(zipf, max_errors=3):
+    """Checks the PNG header of every ground truth frame in a submission archive
+    against the manifest, in parallel. Only a few bytes of every member are read.
+    Returns the lines of an error message, or an empty list."""
+    manifest = get_manifest()
+
+    with ThreadPoolExecutor(max_workers=PREFLIGHT_WORKERS) as executor:
+        problems = executor.map(
+            lambda name: check_frame(zipf, name, manifest[name]), sorted(manifest)
+        )
+        problems = [problem for problem in problems if problem]
+
+    if not problems:
+        return []
+    return (
+        ["Some frames do not match the format of the test set:"]
+        + problems[:max_errors]
+        + (
+            [f"...and {len(problems) - max_errors} more."]
+            if len(problems) > max_errors
+            else []
+        )
+    )
+
+
+def get_submission_errors(namelist):
+    """Checks the members of a submission archive against the evaluation files,
+    returns the lines of an error message if they don't match, else an empty list."""
+    upload_files = set(filter(lambda name: name.endswith(".png"), namelist))
+    eval_files = get_eval_files()
+
+    if len(upload_files) < len(eval_files):
+        return [
+            "Some test files appear to be missing! Please ensure that format is correct.",
+            f'Example of missing file: "{next(iter(eval_files - upload_files))}"',
+        ]
+    elif len(upload_files) > len(eval_files):
+        return [
+            "Unexpected additional files found:",
+            f'Example of missing file: "{next(iter(upload_files - eval_files))}"',
+        ]
+    elif eval_files != upload_files:
+        return [
+            "Submission does not follow correct directory structure.",
+            "Expected structure: <SCENE-NAME>/<FRAME-IDX>.png",
+            f'Instead got frames such as "{next(iter(upload_files))}"',
+        ]
+    return []
+
+
+def get_archive_errors(path):
+    """Validates a submission archive on disk, first its members and then the
+    headers of its frames. Returns the lines of an error message, or an empty list."""
+    try:
+        with ZipFile(path) as zipf:
+            return get_submission_errors(zipf.namelist()) or get_frame_errors(zipf)
+    except (BadZipFile, RuntimeError):
+        return ["Malformed ZIP file."]
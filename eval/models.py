@@ -1,13 +1,21 @@
 import uuid
+from functools import cache
+from pathlib import Path
 
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.images import get_image_dimensions
 from django.db import models
 
 from .constants import MEDIA_DIRECTORY, RESULTENTRY_NAME_MAX_LENGTH, UPLOAD_DIRECTORY
 
 
+@cache
+def make_directory(path):
+    path.mkdir(parents=True, exist_ok=True)
+
+
 class EntryVisibility(models.TextChoices):
     PUBL = "PUBL", "Public"
     PRIV = "PRIV", "Private"
@@ -21,20 +29,78 @@ class EntryStatus(models.TextChoices):
     FAIL = "FAIL", "There was a problem with the submission."
 
 
+class StorageKind(models.TextChoices):
+    UPLOAD = "UPLOAD", "Upload archive"
+    SAMPLE = "SAMPLE", "Sample frame"
+
+    @property
+    def root(self):
+        return UPLOAD_DIRECTORY if self == StorageKind.UPLOAD else MEDIA_DIRECTORY
+
+
+class StoredFile(models.Model):
+    """Ledger of the files kept on disk for an entry: its upload archive until it is
+    evaluated, and its sample frames. Rows are added as files are written and removed
+    along with them (see eval/storage.py), so that finding an entry's files needs no
+    disk access. The ledger is reconciled with the disk by `storage_gc`."""
+
+    object_id = models.PositiveBigIntegerField()
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    entry = GenericForeignKey("content_type", "object_id")
+    kind = models.CharField(max_length=6, choices=StorageKind)
+    # Relative to the root directory of its kind
+    path = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "path"], name="unique_stored_file"),
+        ]
+        indexes = [
+            models.Index(fields=["content_type", "object_id", "kind"]),
+        ]
+
+    def __str__(self):
+        return str(self.full_path)
+
+    @property
+    def full_path(self):
+        return StorageKind(self.kind).root / self.path
+
+
 class ResultSample(models.Model):
     object_id = models.PositiveBigIntegerField()
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     entry = GenericForeignKey("content_type", "object_id")
     file = models.ImageField(unique=True)
 
+    # Denormalized from `file` so that views need not touch the filesystem:
+    # the path relative to the entry's sample directory, i.e. <SCENE>/<FRAME>.png,
+    # and the image's dimensions (null if unknown).
+    subpath = models.CharField(max_length=255, blank=True, default="")
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
     class Meta:
         indexes = [
-            models.Index(fields=["content_type", "object_id"]),
+            models.Index(fields=["content_type", "object_id", "subpath"]),
         ]
 
     def __str__(self):
         return self.file.path
 
+    def fill_subpath(self, entry=None):
+        entry = entry or self.entry
+        self.subpath = str(
+            Path(self.file.name).relative_to(
+                entry.sample_directory.relative_to(MEDIA_DIRECTORY)
+            )
+        )
+
+    def fill_dimensions(self):
+        self.width, self.height = get_image_dimensions(self.file.path)
+
 
 class ResultEntry(models.Model):
     # Managed / Auto generated fields
@@ -47,6 +113,7 @@ class ResultEntry(models.Model):
         max_length=9, choices=EntryStatus, blank=False, null=False
     )
     samples = GenericRelation(ResultSample)
+    stored_files = GenericRelation(StoredFile)
     md5sum = models.CharField(max_length=32)
     is_active = models.BooleanField(default=True)
 
@@ -66,25 +133,37 @@ class ResultEntry(models.Model):
         return (
             UPLOAD_DIRECTORY
             / self.PREFIX
-            / f"upload_{self.creator.id:06}_{self.uuid}.zip"
+            / f"upload_{self.creator_id:06}_{self.uuid}.zip"
         )
 
+    def make_upload_directory(self):
+        # Created on first use rather than at import, then remembered per process
+        make_directory(self.upload_path.parent)
+
+    @property
+    def partial_upload_path(self):
+        # Staging file of a chunked upload, moved to `upload_path` once complete
+        return self.upload_path.with_suffix(".part")
+
     @property
     def sample_directory(self):
-        return MEDIA_DIRECTORY / self.PREFIX / f"{self.creator.id:06}" / f"{self.uuid}"
+        return MEDIA_DIRECTORY / self.PREFIX / f"{self.creator_id:06}" / f"{self.uuid}"
 
     def can_be_seen_by(self, user):
+        return self.is_visible_to(user, self.creator_id, self.visibility)
+
+    @staticmethod
+    def is_visible_to(user, creator_id, visibility):
         return (
             user.is_superuser
-            or (self.visibility != EntryVisibility.PRIV)
-            or (user.is_authenticated and user.pk == self.creator.pk)
+            or (visibility != EntryVisibility.PRIV)
+            or (user.is_authenticated and user.pk == creator_id)
         )
 
 
 class ReconstructionEntry(ResultEntry):
     # Upload directory prefix
     PREFIX = "reconstruction"
-    (UPLOAD_DIRECTORY / PREFIX).mkdir(exist_ok=True)
 
     # Evaluation fields
     psnr_mean = models.FloatField("Mean\nPSNR ↑", default=-1, null=True)
@@ -113,6 +192,12 @@ class ReconstructionEntry(ResultEntry):
 
     class Meta:
         verbose_name_plural = "reconstruction entries"
+        indexes = [
+            # Counting a user's recent uploads, see core.quotas.UploadQuota
+            models.Index(fields=["creator", "pub_date"]),
+            # Ordering the admin changelist
+            models.Index(fields=["pub_date"]),
+        ]
 
     @property
     def metrics(self):
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from .models import EntryStatus, ReconstructionEntry
+
+METRICS = [m.name for m in ReconstructionEntry.metric_fields]
+PSNR_METRICS = [m for m in METRICS if m.startswith("psnr")]
+SSIM_METRICS = [m for m in METRICS if m.startswith("ssim")]
+LPIPS_METRICS = [m for m in METRICS if m.startswith("lpips")]
+
+
+@dataclass
+class RankedEntries:
+    pks: np.ndarray
+    uuids: list
+    emails: list
+    # Scores and ranks (1 is best) of every entry, with shape (configurations, entries)
+    scores: np.ndarray
+    ranks: np.ndarray
+
+
+def load_metrics():
+    """Returns the pks, uuids and creator emails of all successful, active entries,
+    and their metrics as an array of shape (entries, metrics) in METRICS order.
+    Missing metrics are NaN."""
+    rows = list(
+        ReconstructionEntry.objects.filter(
+            process_status=EntryStatus.SUCCESS, is_active=True
+        )
+        .order_by("pk")
+        .values_list("pk", "uuid", "creator__email", *METRICS)
+    )
+    pks = np.array([row[0] for row in rows], dtype=np.int64)
+    uuids = [str(row[1]) for row in rows]
+    emails = [row[2] for row in rows]
+    values = np.array([row[3:] for row in rows], dtype=float).reshape(
+        len(rows), len(METRICS)
+    )
+    return pks, uuids, emails, values
+
+
+def normalize(values, psnr_ranges):
+    """Maps metrics to [0, 1] where higher is better: PSNR linearly between the
+    bounds of each range, SSIM as is, LPIPS as 1 - LPIPS. Missing or negative
+    (not evaluated) metrics count as 0.
+
+    Returns the normalized PSNR metrics, of shape (ranges, entries, PSNR metrics),
+    and the others, of shape (entries, other metrics)."""
+    valid = ~np.isnan(values) & (values >= 0)
+    values = np.where(valid, values, 0)
+
+    psnr = values[:, [METRICS.index(m) for m in PSNR_METRICS]]
+    psnr_valid = valid[:, [METRICS.index(m) for m in PSNR_METRICS]]
+    low, high = np.asarray(psnr_ranges, dtype=float).reshape(-1, 2).T
+    psnr = (psnr[None] - low[:, None, None]) / (high - low)[:, None, None]
+    psnr = np.where(psnr_valid[None], np.clip(psnr, 0, 1), 0)
+
+    ssim = values[:, [METRICS.index(m) for m in SSIM_METRICS]]
+    lpips = values[:, [METRICS.index(m) for m in LPIPS_METRICS]]
+    lpips_valid = valid[:, [METRICS.index(m) for m in LPIPS_METRICS]]
+    others = np.concatenate(
+        [np.clip(ssim, 0, 1), np.where(lpips_valid, np.clip(1 - lpips, 0, 1), 0)],
+        axis=1,
+    )
+    return psnr, others
+
+
+def score(values, weights, psnr_ranges):
+    """Scores every entry under every combination of weights and PSNR range in one
+    pass. `weights` has shape (weightings, metrics), in METRICS order, and is already
+    divided by the total of each weighting. Returns scores of shape
+    (weightings * ranges, entries), ordered by weighting first."""
+    psnr, others = normalize(values, psnr_ranges)
+    psnr_weights = weights[:, [METRICS.index(m) for m in PSNR_METRICS]]
+    other_weights = weights[:, [METRICS.index(m) for m in SSIM_METRICS + LPIPS_METRICS]]
+
+    # (weightings, ranges, entries)
+    scores = np.einsum("wk,rek->wre", psnr_weights, psnr)
+    scores += (others @ other_weights.T).T[:, None, :]
+    return scores.reshape(-1, values.shape[0])
+
+
+def rank(scores):
+    """Returns the rank (1 is best) of every entry per configuration, ties are
+    broken by pk as entries are loaded in pk order."""
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1)[None], axis=1)
+    return ranks
+
+
+def rank_entries(weights, totals, psnr_ranges):
+    """Loads all metrics once and ranks the entries under every configuration, see
+    `score`."""
+    pks, uuids, emails, values = load_metrics()
+    weights = (
+        np.asarray(weights, dtype=float) / np.asarray(totals, dtype=float)[:, None]
+    )
+    scores = score(values, weights, psnr_ranges)
+    return RankedEntries(pks, uuids, emails, scores, rank(scores))
+
+
+def stability(ranks, top_k):
+    """Per entry, the fraction of configurations in which it ranks in the top K,
+    and its best, median and worst rank."""
+    return {
+        "top_k_rate": (ranks <= top_k).mean(axis=0),
+        "best_rank": ranks.min(axis=0),
+        "median_rank": np.median(ranks, axis=0),
+        "worst_rank": ranks.max(axis=0),
+    }
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_entries_version
+from .models import ReconstructionEntry
+
+
+@receiver(post_save, sender=ReconstructionEntry)
+@receiver(post_delete, sender=ReconstructionEntry)
+def invalidate_entry_caches(sender, **kwargs):
+    # Wait for the commit, or other processes could rebuild their caches from stale data
+    transaction.on_commit(bump_entries_version)
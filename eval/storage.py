@@ -0,0 +1,83 @@
+import os
+import re
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.contrib.contenttypes.models import ContentType
+
+from .models import StoredFile
+
+# The entry a file belongs to is named in its path, see `ResultEntry.upload_path`
+# and `ResultEntry.sample_directory`
+ENTRY_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def stored_file(entry, kind, path):
+    """Returns an unsaved ledger row for a file of an entry, which must exist."""
+    return StoredFile(
+        content_type=ContentType.objects.get_for_model(entry),
+        object_id=entry.pk,
+        kind=kind,
+        path=str(path.relative_to(kind.root)),
+        size=path.stat().st_size,
+    )
+
+
+def record_file(entry, kind, path):
+    """Adds a file that was just written for an entry to the ledger."""
+    row = stored_file(entry, kind, path)
+    StoredFile.objects.update_or_create(
+        kind=kind,
+        path=row.path,
+        defaults={
+            "content_type": row.content_type,
+            "object_id": row.object_id,
+            "size": row.size,
+        },
+    )
+
+
+def remove_file(kind, path):
+    """Deletes a file and its row in the ledger, if any."""
+    path.unlink(missing_ok=True)
+    StoredFile.objects.filter(kind=kind, path=str(path.relative_to(kind.root))).delete()
+
+
+def entry_uuid(path):
+    """Returns the uuid of the entry named in a path relative to a storage root, or
+    None if there is none."""
+    match = ENTRY_UUID.search(path)
+    return uuid.UUID(match.group()) if match else None
+
+
+def scan_files(root, workers=8, skip_suffixes=()):
+    """Lists every file below `root`, reading directories in parallel. Returns a dict
+    mapping paths relative to `root` to their stat result."""
+    files = {}
+
+    def read(directory):
+        subdirectories = []
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    subdirectories.append(item.path)
+                elif item.is_file(follow_symlinks=False) and not item.name.endswith(
+                    skip_suffixes
+                ):
+                    files[os.path.relpath(item.path, root)] = item.stat(
+                        follow_symlinks=False
+                    )
+        return subdirectories
+
+    if not root.is_dir():
+        return files
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(read, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending |= {
+                    executor.submit(read, directory) for directory in future.result()
+                }
+    return files
@@ -0,0 +1,325 @@
+import base64
+import hashlib
+import io
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+from unittest import mock
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED, ZipFile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarks import benchmark_settings
+from eval.constants import MAX_UPLOADS_PER_DAY
+from eval.manifest import (
+    PNG_SIGNATURE,
+    Frame,
+    get_archive_errors,
+    get_eval_files,
+    get_manifest,
+)
+from eval.models import EntryStatus, EntryVisibility, ReconstructionEntry
+
+User = get_user_model()
+
+# A ground truth of two small RGB frames
+FRAMES = {
+    name: Frame(
+        width=4, height=3, bit_depth=8, color_type=2, md5sum="", is_sample=False
+    )
+    for name in ("scene/000000.png", "scene/000001.png")
+}
+
+
+def make_png(width=4, height=3, bit_depth=8, color_type=2):
+    """Returns the start of a PNG file, up to and including its IHDR chunk, which is
+    all that is read of submitted frames."""
+    data = struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)
+    chunk = b"IHDR" + data
+    return (
+        PNG_SIGNATURE
+        + struct.pack(">I", len(data))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+    )
+
+
+def make_archive(frames=None, compression=ZIP_STORED):
+    """Returns the bytes of a zip archive with a PNG for every frame of `FRAMES`, or
+    the given dict of member names to contents."""
+    if frames is None:
+        frames = {name: make_png() for name in FRAMES}
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w", compression) as zipf:
+        for name, content in frames.items():
+            zipf.writestr(name, content)
+    return buffer.getvalue()
+
+
+# Renders pages without requiring collectstatic
+@benchmark_settings()
+class SubmissionTestCase(TestCase):
+    """Runs against the ground truth of `FRAMES` and stores uploads in a temporary
+    directory, as a verified user that is allowed to upload."""
+
+    @classmethod
+    def setUpClass(cls):
+        manifest = {"frames": {name: frame._asdict() for name, frame in FRAMES.items()}}
+        cls.enterClassContext(
+            mock.patch("eval.manifest.load_manifest", return_value=manifest)
+        )
+        for func in (get_manifest, get_eval_files):
+            func.cache_clear()
+            cls.addClassCleanup(func.cache_clear)
+
+        cls.upload_directory = Path(
+            cls.enterClassContext(tempfile.TemporaryDirectory())
+        )
+        cls.enterClassContext(
+            mock.patch("eval.models.UPLOAD_DIRECTORY", cls.upload_directory)
+        )
+        cls.enterClassContext(
+            mock.patch(
+                "eval.uploads.PARTIAL_UPLOAD_DIRECTORY",
+                cls.upload_directory / ".partial",
+            )
+        )
+        # Read from the environment at import
+        cls.enterClassContext(mock.patch("core.models.UPLOADS_ENABLED", True))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="uploader@test.test",
+            university="University of Uploads",
+            is_active=True,
+            is_verified=True,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def partial_uploads(self):
+        return list((self.upload_directory / ".partial").glob("*"))
+
+    def submit(self, content):
+        return self.client.post(
+            reverse("eval:submit"),
+            {
+                "name": "submission",
+                "visibility": EntryVisibility.PRIV,
+                "submission": SimpleUploadedFile(
+                    "submission.zip", content, content_type="application/zip"
+                ),
+            },
+        )
+
+
+class StreamedUploadTests(SubmissionTestCase):
+    """Submissions are hashed and listed by `SubmissionUploadHandler` while they are
+    written to the upload directory."""
+
+    def test_submission(self):
+        content = make_archive()
+        response = self.submit(content)
+        self.assertRedirects(
+            response, reverse("core:user"), fetch_redirect_response=False
+        )
+
+        entry = ReconstructionEntry.objects.get(creator=self.user)
+        self.assertEqual(entry.process_status, EntryStatus.WAIT_PROC)
+        self.assertEqual(entry.md5sum, hashlib.md5(content).hexdigest())
+        self.assertEqual(entry.upload_path.read_bytes(), content)
+        self.assertEqual(self.partial_uploads(), [])
+
+    def test_malformed_archive(self):
+        response = self.submit(b"PK\x03\x04 but not a zip archive")
+        self.assertFormError(
+            response.context["form"], "submission", "Malformed ZIP file."
+        )
+        self.assertFalse(ReconstructionEntry.objects.exists())
+        # The partial upload is deleted at the end of the request
+        self.assertEqual(self.partial_uploads(), [])
+
+    def test_invalid_frames(self):
+        frames = {name: make_png(width=8) for name in FRAMES}
+        response = self.submit(make_archive(frames))
+        self.assertIn(
+            "has a resolution of 8x3, expected 4x3",
+            str(response.context["form"].errors["submission"]),
+        )
+        self.assertFalse(ReconstructionEntry.objects.exists())
+        self.assertEqual(self.partial_uploads(), [])
+
+
+class UploadQuotaTests(SubmissionTestCase):
+    """Users may upload MAX_UPLOADS_PER_DAY times in any 24 hours, including uploads
+    they deleted since."""
+
+    def upload(self, age, is_active=True):
+        return ReconstructionEntry.objects.create(
+            creator=self.user,
+            name="earlier",
+            pub_date=timezone.now() - age,
+            process_status=EntryStatus.SUCCESS,
+            is_active=is_active,
+        )
+
+    def test_over_quota(self):
+        self.upload(timezone.timedelta(hours=23), is_active=False)
+        for _ in range(MAX_UPLOADS_PER_DAY - 1):
+            self.upload(timezone.timedelta(hours=1))
+
+        response = self.submit(make_archive())
+        self.assertRedirects(
+            response, reverse("core:user"), fetch_redirect_response=False
+        )
+        self.assertEqual(self.user.entries.count(), MAX_UPLOADS_PER_DAY)
+        self.assertEqual(self.partial_uploads(), [])
+        response = self.client.post(
+            reverse("eval:upload-create"),
+            {"name": "chunked", "visibility": EntryVisibility.PRIV},
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("core:user"))
+        self.assertEqual(response.context["uploads_remaining"], 0)
+        self.assertContains(response, "reached the maximum allowable daily uploads")
+
+    def test_quota_window(self):
+        self.upload(timezone.timedelta(hours=25))
+        for _ in range(MAX_UPLOADS_PER_DAY - 1):
+            self.upload(timezone.timedelta(hours=1))
+
+        response = self.submit(make_archive())
+        self.assertRedirects(
+            response, reverse("core:user"), fetch_redirect_response=False
+        )
+        self.assertEqual(self.user.entries.count(), MAX_UPLOADS_PER_DAY + 1)
+        self.assertTrue(
+            self.user.entries.filter(process_status=EntryStatus.WAIT_PROC).exists()
+        )
+
+
+class ChunkedUploadTests(SubmissionTestCase):
+    """Chunks are only appended at the offset received so far, and the archive is
+    validated once the upload is finalized."""
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post(
+            reverse("eval:upload-create"),
+            {"name": "chunked", "visibility": EntryVisibility.PRIV},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.url = response["Location"]
+        self.content = make_archive()
+
+    def send(self, offset, chunk, **headers):
+        return self.client.patch(
+            self.url,
+            chunk,
+            content_type="application/offset+octet-stream",
+            headers={"Upload-Offset": str(offset), **headers},
+        )
+
+    def test_upload(self):
+        middle = len(self.content) // 2
+        for offset, chunk in [
+            (0, self.content[:middle]),
+            (middle, self.content[middle:]),
+        ]:
+            response = self.send(offset, chunk)
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(int(response["Upload-Offset"]), offset + len(chunk))
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        entry = ReconstructionEntry.objects.get(creator=self.user)
+        self.assertEqual(entry.process_status, EntryStatus.WAIT_PROC)
+        self.assertEqual(entry.md5sum, hashlib.md5(self.content).hexdigest())
+        self.assertEqual(entry.upload_path.read_bytes(), self.content)
+        # Finalized, there is nothing to append to any more
+        self.assertEqual(self.send(len(self.content), b"x").status_code, 404)
+
+    def test_offset_mismatch(self):
+        self.assertEqual(self.send(0, self.content[:10]).status_code, 204)
+        # A chunk that was already received, e.g. retried after a lost response
+        response = self.send(0, self.content[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(int(response["Upload-Offset"]), 10)
+        # A chunk past the end of what was received
+        response = self.send(20, self.content[20:30])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(int(response["Upload-Offset"]), 10)
+
+        entry = ReconstructionEntry.objects.get(creator=self.user)
+        self.assertEqual(entry.partial_upload_path.read_bytes(), self.content[:10])
+
+    def test_checksum_mismatch(self):
+        digest = base64.b64encode(hashlib.sha1(b"other").digest()).decode()
+        response = self.send(0, self.content, **{"Upload-Checksum": f"sha1 {digest}"})
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(int(response["Upload-Offset"]), 0)
+
+
+class ArchiveErrorTests(SubmissionTestCase):
+    """Frames that can't be read from an archive are reported as errors."""
+
+    NAME = "scene/000001.png"
+
+    def archive_errors(self, content):
+        path = self.upload_directory / "archive.zip"
+        path.write_bytes(content)
+        return get_archive_errors(path)
+
+    def corrupt(self, compression, skip=0):
+        """Returns an archive whose frame `NAME` has garbage at the start of its data,
+        after the first `skip` bytes."""
+        content = bytearray(make_archive(compression=compression))
+        with ZipFile(io.BytesIO(content)) as zipf:
+            offset = zipf.getinfo(self.NAME).header_offset
+        name_length, extra_length = struct.unpack_from("<HH", content, offset + 26)
+        start = offset + 30 + name_length + extra_length + skip
+        content[start : start + 10] = bytes(
+            b ^ 0xFF for b in content[start : start + 10]
+        )
+        return bytes(content)
+
+    def test_valid(self):
+        for compression in (ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA):
+            with self.subTest(compression=compression):
+                self.assertEqual(
+                    self.archive_errors(make_archive(compression=compression)), []
+                )
+
+    def test_corrupt_frame(self):
+        # LZMA data starts with a header of the compressor version and properties
+        for compression, skip in [(ZIP_DEFLATED, 0), (ZIP_BZIP2, 0), (ZIP_LZMA, 9)]:
+            with self.subTest(compression=compression):
+                errors = self.archive_errors(self.corrupt(compression, skip))
+                self.assertEqual(
+                    errors,
+                    [
+                        "Some frames do not match the format of the test set:",
+                        f'"{self.NAME}" could not be read from the archive.',
+                    ],
+                )
+
+    def test_truncated_frame(self):
+        # Keep the central directory, but cut the frame's data short
+        content = make_archive(compression=ZIP_DEFLATED)
+        with ZipFile(io.BytesIO(content)) as zipf:
+            info = zipf.getinfo(self.NAME)
+            directory = zipf.start_dir
+        truncated = content[: info.header_offset + 40] + b"\0" * (
+            directory - info.header_offset - 40
+        )
+        errors = self.archive_errors(truncated + content[directory:])
+        self.assertIn(f'"{self.NAME}" could not be read from the archive.', errors)
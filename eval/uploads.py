@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+import uuid
+from zipfile import BadZipFile, ZipFile
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from .constants import UPLOAD_DIRECTORY
+
+PARTIAL_UPLOAD_DIRECTORY = UPLOAD_DIRECTORY / ".partial"
+
+
+class StreamedSubmissionFile(UploadedFile):
+    """A submission that was written straight into the upload directory as it was
+    received. Its md5sum and the names of the archive's members are known as soon
+    as the upload completes, without reading the file back.
+
+    The file is deleted when closed (i.e. at the end of the request) unless it was
+    moved to its final location with `move_to`.
+    """
+
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        PARTIAL_UPLOAD_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        self.path = PARTIAL_UPLOAD_DIRECTORY / f"{uuid.uuid4()}.part"
+        # Owned by this object from here on, and closed (and deleted) by `close`
+        file = open(self.path, "w+b")  # noqa: SIM115
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+        self.md5sum = None
+        self.namelist = None
+        self.zip_error = None
+
+    def temporary_file_path(self):
+        return str(self.path)
+
+    def move_to(self, path):
+        self.file.close()
+        os.replace(self.path, path)
+        self.path = None
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            if self.path is not None:
+                self.path.unlink(missing_ok=True)
+
+
+class SubmissionUploadHandler(FileUploadHandler):
+    """Upload handler that streams submission archives directly into the upload
+    directory while hashing them, instead of spooling them to a temporary file first.
+
+    The zip central directory sits at the end of the archive, so the last
+    `TAIL_SIZE` bytes are kept in memory to list the archive's members once the
+    upload completes. Only for archives with exceptionally large directories is the
+    tail of the file on disk read instead. Other file fields are left to the next
+    upload handlers.
+    """
+
+    FIELD_NAME = "submission"
+    TAIL_SIZE = 4 * 1024 * 1024
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.activated = field_name == self.FIELD_NAME
+
+        if self.activated:
+            self.file = StreamedSubmissionFile(
+                self.file_name, self.content_type, self.charset, self.content_type_extra
+            )
+            self.md5sum = hashlib.md5()
+            self.tail = bytearray()
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+
+        self.md5sum.update(raw_data)
+        try:
+            self.file.write(raw_data)
+        except BaseException:
+            # Django only closes the files of complete uploads when parsing fails
+            self.file.close()
+            raise
+        self.tail += raw_data
+        del self.tail[: -self.TAIL_SIZE]
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.md5sum = self.md5sum.hexdigest()
+
+        try:
+            try:
+                with ZipFile(io.BytesIO(self.tail)) as zipf:
+                    self.file.namelist = zipf.namelist()
+            except BadZipFile:
+                # The central directory did not fit in the tail, find it on disk
+                with ZipFile(self.file.file) as zipf:
+                    self.file.namelist = zipf.namelist()
+                self.file.seek(0)
+        except (BadZipFile, RuntimeError) as e:
+            self.file.zip_error = e
+
+        self.tail = None
+        return self.file
+
+    def upload_interrupted(self):
+        # The request body ended before the file did, it will never be completed
+        if getattr(self, "activated", False):
+            self.file.close()
@@ -1,18 +1,33 @@
 from django.urls import path
 
+from core.views import server_view
+
 from . import views
 
+ReconstructionEntriesView = server_view(
+    views.ReconstructionEntriesView, views.AsyncReconstructionEntriesView
+)
+DetailView = server_view(views.DetailView, views.AsyncDetailView)
+CompareView = server_view(views.CompareView, views.AsyncCompareView)
+
 app_name = "eval"
 urlpatterns = [
     path("submit", views.SubmitView.as_view(), name="submit"),
+    path("upload", views.ChunkedUploadCreateView.as_view(), name="upload-create"),
+    path("upload/<uuid:uuid>", views.ChunkedUploadView.as_view(), name="upload"),
     path(
         "reconstruction",
-        views.ReconstructionEntriesView.as_view(),
+        ReconstructionEntriesView.as_view(),
         name="reconstruction",
     ),
-    path("detail/<int:pk>", views.DetailView.as_view(), name="detail"),
-    path("compare/", views.CompareView.as_view(), name="compare"),
-    path("compare/<int:pk1>/<int:pk2>", views.CompareView.as_view(), name="compare"),
+    path(
+        "api/reconstruction",
+        views.ReconstructionEntriesAPIView.as_view(),
+        name="reconstruction-api",
+    ),
+    path("detail/<int:pk>", DetailView.as_view(), name="detail"),
+    path("compare/", CompareView.as_view(), name="compare"),
+    path("compare/<int:pk1>/<int:pk2>", CompareView.as_view(), name="compare"),
     path("edit/<int:pk>", views.EditView.as_view(), name="edit"),
     path("edit/<int:pk>/delete", views.DeleteEntryView.as_view(), name="delete"),
 ]
@@ -1,33 +1,65 @@
+import base64
+import binascii
+import csv
+import fcntl
 import hashlib
-import random
+import itertools
+import json
+import os
 from pathlib import Path
-from zipfile import BadZipFile, ZipFile
+from zipfile import ZipFile
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import Paginator
-from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.template.response import TemplateResponse
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.utils.html import format_html
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
 from django.views import View, generic
 
-from .constants import EVAL_FILES, MEDIA_DIRECTORY, SAMPLE_FRAMES_DIRECTORY
-from .forms import EditResultEntryForm, UploadFileForm
-from .models import EntryStatus, EntryVisibility, ReconstructionEntry
+from core.exports import Echo
+from core.quotas import COMPARES
+
+from .cache import get_neighbours, sample_visible_pair
+from .constants import (
+    MAX_UPLOAD_CHUNK_SIZE,
+    MAX_UPLOAD_SIZE,
+    MEDIA_DIRECTORY,
+    SAMPLE_FRAMES_DIRECTORY,
+)
+from .forms import ChunkedUploadForm, EditResultEntryForm, UploadFileForm
+from .manifest import get_archive_errors, get_frame_errors, get_submission_errors
+from .models import EntryStatus, EntryVisibility, ReconstructionEntry, StorageKind
+from .storage import record_file, remove_file
 
 
 def get_visible_entries(request, model):
     # Get all SUCCESS and active entries
-    entries = model.objects.filter(
-        process_status=EntryStatus.SUCCESS, is_active=True
-    )
+    entries = model.objects.filter(process_status=EntryStatus.SUCCESS, is_active=True)
 
     # Base visibility filter
-    visible_q = Q(
-        visibility__in=[EntryVisibility.PUBL, EntryVisibility.ANON]
-    )
+    visible_q = Q(visibility__in=[EntryVisibility.PUBL, EntryVisibility.ANON])
     if request.user.is_authenticated:
         visible_q |= Q(creator=request.user)
 
@@ -37,26 +69,37 @@ def get_visible_entries(request, model):
     return entries
 
 
-class ReconstructionEntriesView(View):
-    VALID_KEYS = {m.name: m.verbose_name for m in ReconstructionEntry.metric_fields}
+def get_sort_order(sortby, model):
+    """Parses a leaderboard `sortby` parameter, returns the metric column, whether
+    best results come first, and the corresponding argument to `order_by`."""
+    valid_keys = {m.name: m.verbose_name for m in model.metric_fields}
+    sortby_col = sortby.removeprefix("-")
+    direction = not sortby.startswith("-")
 
-    def get(self, request):
-        sortby = request.GET.get("sortby", "")
-        collapse_users = request.GET.get("collapse", "0") == "1"
-        creator_id = request.GET.get("creator")
+    if sortby_col not in valid_keys:
+        sortby = model.metric_fields[0].name
         sortby_col = sortby.removeprefix("-")
-        direction = not sortby.startswith("-")
 
-        if sortby_col not in self.VALID_KEYS:
-            sortby = ReconstructionEntry.metric_fields[0].name
-            sortby_col = sortby.removeprefix("-")
+    # Flip direction if metric if higher-is-better
+    if "↑" in valid_keys[sortby_col]:
+        sortby = f"-{sortby}" if direction else sortby.removeprefix("-")
+    return sortby_col, direction, sortby
+
 
-        # Flip direction if metric if higher-is-better
-        if "↑" in self.VALID_KEYS[sortby_col]:
-            sortby = f"-{sortby}" if direction else sortby.removeprefix("-")
+class LeaderboardMixin:
+    model = ReconstructionEntry
+
+    def get_leaderboard(self, request):
+        """Returns the visible, sorted and optionally collapsed leaderboard entries
+        along with the parsed query options, shared by the HTML and API views."""
+        collapse_users = request.GET.get("collapse", "0") == "1"
+        creator_id = request.GET.get("creator")
+        sortby_col, direction, sortby = get_sort_order(
+            request.GET.get("sortby", ""), self.model
+        )
 
         # Visible entries are SUCCESS, active, and either user's entries or not-private
-        entries = get_visible_entries(request, ReconstructionEntry).exclude(**{sortby_col: -1.0})
+        entries = get_visible_entries(request, self.model).exclude(**{sortby_col: -1.0})
 
         # Filter by creator if requested
         if creator_id is not None:
@@ -64,7 +107,9 @@ class ReconstructionEntriesView(View):
             collapse_users = False
 
         # Order by selected metric, respect higher-is-better or not
-        entries = entries.order_by(sortby)
+        # Ties are broken by id so that the ordering is total, which keyset pagination needs
+        descending = sortby.startswith("-")
+        entries = entries.order_by(sortby, "-id" if descending else "id")
 
         if collapse_users:
             if request.user.is_authenticated:
@@ -117,38 +162,164 @@ class ReconstructionEntriesView(View):
         else:
             entries = entries.annotate(collapsed_count=Value(1))
 
+        options = {
+            "sortby": sortby_col,
+            "descending": descending,
+            "direction": direction,
+            "collapse": collapse_users,
+            "creator": creator_id,
+        }
+        return entries, options
+
+
+class ReconstructionEntriesView(LeaderboardMixin, View):
+    def get(self, request):
+        entries, options = self.get_leaderboard(request)
+
         paginator = Paginator(entries, 25)
         page_number = request.GET.get("page")
         page_obj = paginator.get_page(page_number)
+        return render(
+            request, "reconstruction.html", self.get_context_data(page_obj, options)
+        )
 
-        context = {
+    def get_context_data(self, page_obj, options):
+        return {
             "page_obj": page_obj,
-            "sortby": sortby_col,
-            "direction": direction,
-            "collapse": collapse_users,
-            "creator": creator_id,
-            "metric_fields": ReconstructionEntry.metric_fields,
+            "sortby": options["sortby"],
+            "direction": options["direction"],
+            "collapse": options["collapse"],
+            "creator": options["creator"],
+            "metric_fields": self.model.metric_fields,
         }
-        return render(request, "reconstruction.html", context)
 
 
-class DeleteEntryView(LoginRequiredMixin, UserPassesTestMixin, generic.DeleteView):
+class AsyncReconstructionEntriesView(ReconstructionEntriesView):
+    async def get(self, request):
+        # The lazy request.user would query the database outside of a thread
+        request.user = await request.auser()
+        entries, options = self.get_leaderboard(request)
+
+        paginator = Paginator(entries, 25)
+        page_number = request.GET.get("page")
+        page_obj = await sync_to_async(paginator.get_page)(page_number)
+
+        # Rendered (and the page's entries queried) in a thread by Django
+        return TemplateResponse(
+            request, "reconstruction.html", self.get_context_data(page_obj, options)
+        )
+
+
+class ReconstructionEntriesAPIView(LeaderboardMixin, View):
+    """Read-only, streamed export of the leaderboard as NDJSON (default) or CSV.
+
+    Accepts the same `sortby`, `collapse` and `creator` options as the leaderboard
+    page. Pages are selected with a cursor instead of an offset: pass the id of the
+    last entry received as `after` to get the next page of at most `limit` entries.
+    A page with fewer than `limit` entries is the last one.
+    """
+
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+    CHUNK_SIZE = 500
+    FIELDS = [
+        "id",
+        "name",
+        "visibility",
+        "creator_id",
+        "pub_date",
+        "citation",
+        "code_url",
+        "collapsed_count",
+    ] + [m.name for m in ReconstructionEntry.metric_fields]
+
+    def get(self, request):
+        entries, options = self.get_leaderboard(request)
+        sortby_col = options["sortby"]
+
+        # Entries without a value for the sort metric have no position in the ranking
+        entries = entries.exclude(**{f"{sortby_col}__isnull": True})
+
+        try:
+            limit = int(request.GET.get("limit", self.DEFAULT_LIMIT))
+            after = request.GET.get("after")
+            after = int(after) if after is not None else None
+        except ValueError:
+            return HttpResponseBadRequest(
+                "Parameters `limit` and `after` must be integers."
+            )
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        if after is not None:
+            # Seek past the (metric, id) position of the cursor entry instead of using OFFSET.
+            # The cursor is looked up among the visible entries, so that a hidden entry
+            # is indistinguishable from one that doesn't exist
+            value = entries.filter(pk=after).values_list(sortby_col, flat=True).first()
+            if value is None:
+                return HttpResponseBadRequest("Unknown cursor.")
+            op = "lt" if options["descending"] else "gt"
+            entries = entries.filter(
+                Q(**{f"{sortby_col}__{op}": value})
+                | Q(**{sortby_col: value, f"id__{op}": after})
+            )
+
+        rows = (
+            self.serialize(request, row)
+            for row in entries.values(*self.FIELDS)[:limit].iterator(
+                chunk_size=self.CHUNK_SIZE
+            )
+        )
+
+        if request.GET.get("format", "ndjson") == "csv":
+            writer = csv.DictWriter(Echo(), fieldnames=self.FIELDS)
+            content = itertools.chain(
+                [writer.writeheader()], (writer.writerow(row) for row in rows)
+            )
+            content_type = "text/csv"
+        else:
+            content = (json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+            content_type = "application/x-ndjson"
+        return StreamingHttpResponse(content, content_type=content_type)
+
+    @staticmethod
+    def serialize(request, row):
+        # Mirror the leaderboard page, which hides who made anonymous entries
+        if row["visibility"] == EntryVisibility.ANON and not (
+            request.user.is_superuser or request.user.pk == row["creator_id"]
+        ):
+            row.update(creator_id=None, citation="", code_url=None)
+        return row
+
+
+class CachedObjectMixin:
+    """Memoizes `get_object`, which is otherwise called (and queried) again by
+    `test_func`, `get` and `get_context_data` within the same request."""
+
+    def get_object(self, queryset=None):
+        if getattr(self, "_cached_object", None) is None:
+            self._cached_object = super().get_object(queryset)
+        return self._cached_object
+
+
+class DeleteEntryView(
+    LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, generic.DeleteView
+):
     model = ReconstructionEntry
     template_name = "confirm_delete.html"
     success_url = reverse_lazy("core:user")
 
     def test_func(self):
-        return self.request.user.pk == self.get_object().creator.pk
+        return self.request.user.pk == self.get_object().creator_id
 
-    def get_object(self, queryset=None):
-        pk = self.kwargs.get(self.pk_url_kwarg)
-        return get_object_or_404(self.model, pk=pk, is_active=True)
+    def get_queryset(self):
+        return self.model.objects.filter(is_active=True)
 
     def form_valid(self, form):
         # Don't actually delete the entry, just mark as inactive
         # Do delete the submission file though
         entry = self.get_object()
-        entry.upload_path.unlink(missing_ok=True)
+        remove_file(StorageKind.UPLOAD, entry.upload_path)
+        entry.partial_upload_path.unlink(missing_ok=True)
         entry.is_active = False
         entry.save()
 
@@ -172,73 +343,205 @@ class SubmitView(LoginRequiredMixin, UserPassesTestMixin, generic.edit.FormView)
         entry.pub_date = timezone.now()
         entry.creator = self.request.user
         upload = self.request.FILES["submission"]
-        md5sum = hashlib.md5()
 
-        # Write uploaded file to disk, return server error (500) if failed
-        # Ensure no half written submission files exist
-        try:
-            with open(entry.upload_path, "wb+") as f:
-                for chunk in upload.chunks():
-                    md5sum.update(chunk)
-                    f.write(chunk)
-        except IOError:
-            entry.upload_path.unlink(missing_ok=True)
-            return HttpResponse(status=500)
-
-        # Validate that submission contains all files
-        try:
-            with ZipFile(entry.upload_path) as zipf:
-                upload_files = set(
-                    filter(lambda name: name.endswith(".png"), zipf.namelist())
-                )
-                if len(upload_files) < len(EVAL_FILES):
-                    entry.upload_path.unlink(missing_ok=True)
-                    form.add_error(
-                        "submission",
-                        format_html(
-                            "{}</br>{}",
-                            "Some test files appear to be missing! Please ensure that format is correct.",
-                            f'Example of missing file: "{next(iter(EVAL_FILES - upload_files))}"',
-                        ),
-                    )
-                    return super().form_invalid(form)
-                elif len(upload_files) > len(EVAL_FILES):
-                    entry.upload_path.unlink(missing_ok=True)
-                    form.add_error(
-                        "submission",
-                        format_html(
-                            "{}</br>{}",
-                            "Unexpected additional files found:",
-                            f'Example of missing file: "{next(iter(upload_files - EVAL_FILES))}"',
-                        ),
-                    )
-                    return super().form_invalid(form)
-                elif EVAL_FILES != upload_files:
-                    entry.upload_path.unlink(missing_ok=True)
-                    form.add_error(
-                        "submission",
-                        format_html(
-                            "{}</br>{}</br>{}",
-                            "Submission does not follow correct directory structure.",
-                            "Expected structure: <SCENE-NAME>/<FRAME-IDX>.png",
-                            f'Instead got frames such as "{next(iter(upload_files))}"',
-                        ),
-                    )
-                    return super().form_invalid(form)
-        except (BadZipFile, RuntimeError):
-            entry.upload_path.unlink(missing_ok=True)
+        # The upload handler already wrote the archive to the upload directory while
+        # hashing it and listed its contents, so none of this needs to read it again.
+        # If validation fails the partial upload is deleted at the end of the request.
+        if upload.zip_error is not None:
             form.add_error("submission", "Malformed ZIP file.")
             return super().form_invalid(form)
 
+        # Validate that submission contains all files, and that they are PNGs with the
+        # same resolution as the test set. Only the headers of the frames are read.
+        errors = get_submission_errors(upload.namelist)
+        if not errors:
+            with ZipFile(upload.temporary_file_path()) as zipf:
+                errors = get_frame_errors(zipf)
+        if errors:
+            form.add_error(
+                "submission", format_html_join(mark_safe("</br>"), "{}", zip(errors))
+            )
+            return super().form_invalid(form)
+
+        # Move the submission in place, return server error (500) if failed
+        try:
+            entry.make_upload_directory()
+            upload.move_to(entry.upload_path)
+        except OSError:
+            return HttpResponse(status=500)
+
         # Mark the entry for later processing
         entry.process_status = EntryStatus.WAIT_PROC
-        entry.md5sum = md5sum.hexdigest()
+        entry.md5sum = upload.md5sum
         entry.save()
+        record_file(entry, StorageKind.UPLOAD, entry.upload_path)
 
         return super().form_valid(form)
 
 
-class DetailView(UserPassesTestMixin, generic.DetailView):
+class ChunkedUploadCreateView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Starts a resumable upload, see `ChunkedUploadView`.
+
+    Takes the same fields as the submission form, except for the file, and creates
+    the entry right away, waiting for its upload. Responds with the url to send the
+    archive's chunks to.
+    """
+
+    model = ReconstructionEntry
+
+    def test_func(self):
+        return self.request.user.can_upload()
+
+    def post(self, request):
+        form = ChunkedUploadForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+
+        entry = form.save(commit=False)
+        entry.pub_date = timezone.now()
+        entry.creator = request.user
+        entry.process_status = EntryStatus.WAIT_UPL
+        entry.save()
+        entry.make_upload_directory()
+        entry.partial_upload_path.touch()
+
+        url = reverse("eval:upload", kwargs={"uuid": entry.uuid})
+        response = JsonResponse({"url": url, "offset": 0}, status=201)
+        response["Location"] = url
+        response["Upload-Offset"] = 0
+        return response
+
+
+class ChunkedUploadView(LoginRequiredMixin, View):
+    """Resumable upload of a submission archive in chunks, loosely following tus.io:
+
+        HEAD   returns the number of bytes received so far in `Upload-Offset`.
+        PATCH  appends the request body, which must start at the `Upload-Offset`
+               given in the request. If an `Upload-Checksum: <algorithm> <base64>`
+               header is sent, a chunk that doesn't match is discarded.
+        POST   finalizes the upload, validating the archive and queuing it for
+               evaluation.
+        DELETE aborts the upload.
+
+    Partial uploads that are abandoned are removed by `clean_partial_uploads`.
+    """
+
+    model = ReconstructionEntry
+    http_method_names = ["head", "patch", "post", "delete"]
+
+    def dispatch(self, request, *args, uuid=None, **kwargs):
+        if request.user.is_authenticated:
+            self.entry = get_object_or_404(
+                self.model,
+                uuid=uuid,
+                creator=request.user,
+                process_status=EntryStatus.WAIT_UPL,
+                is_active=True,
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+    def offset_response(self, offset, status=204):
+        response = HttpResponse(status=status)
+        response["Upload-Offset"] = offset
+        response["Cache-Control"] = "no-store"
+        return response
+
+    def open_upload(self, mode):
+        try:
+            return open(self.entry.partial_upload_path, mode)
+        except FileNotFoundError:
+            # Finalized or aborted by a concurrent request
+            raise Http404("No upload in progress.") from None
+
+    def head(self, request):
+        return self.offset_response(self.entry.partial_upload_path.stat().st_size, 200)
+
+    def patch(self, request):
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest(
+                "Upload-Offset and Content-Length are required."
+            )
+
+        checksum = None
+        if "Upload-Checksum" in request.headers:
+            try:
+                algorithm, digest = request.headers["Upload-Checksum"].split(" ", 1)
+                checksum = hashlib.new(algorithm.lower())
+                digest = base64.b64decode(digest)
+            except (ValueError, binascii.Error):
+                return HttpResponseBadRequest("Malformed Upload-Checksum.")
+
+        if length > MAX_UPLOAD_CHUNK_SIZE or offset + length > MAX_UPLOAD_SIZE:
+            return HttpResponse(status=413)
+
+        with self.open_upload("r+b") as f:
+            # Only one request may append at a time
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return HttpResponse("Upload is busy.", status=423)
+
+            if offset != (current := f.seek(0, os.SEEK_END)):
+                return self.offset_response(current, 409)
+
+            # Stream the chunk to disk, and roll back if it's incomplete or corrupted
+            received = 0
+            while received < length and (
+                chunk := request.read(min(length - received, 64 * 1024))
+            ):
+                f.write(chunk)
+                received += len(chunk)
+                if checksum:
+                    checksum.update(chunk)
+
+            if received != length or (checksum and checksum.digest() != digest):
+                f.truncate(offset)
+                return self.offset_response(offset, 460 if received == length else 400)
+
+        return self.offset_response(offset + length)
+
+    def post(self, request):
+        entry = self.entry
+        path = entry.partial_upload_path
+
+        with self.open_upload("rb") as f:
+            # Hold the same lock as PATCH until the archive is moved in place, so
+            # that no chunk is appended after it was validated and hashed
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return HttpResponse("Upload is busy.", status=423)
+
+            errors = get_archive_errors(path)
+            if errors:
+                # Like an invalid form submission, this doesn't count as an upload
+                path.unlink(missing_ok=True)
+                entry.delete()
+                return JsonResponse({"errors": {"submission": errors}}, status=400)
+
+            md5sum = hashlib.md5()
+            while chunk := f.read(1024 * 1024):
+                md5sum.update(chunk)
+
+            # Move the submission in place and mark the entry for later processing
+            path.replace(entry.upload_path)
+            entry.process_status = EntryStatus.WAIT_PROC
+            entry.md5sum = md5sum.hexdigest()
+            entry.save()
+
+        record_file(entry, StorageKind.UPLOAD, entry.upload_path)
+        return JsonResponse({"url": reverse("core:user")})
+
+    def delete(self, request):
+        self.entry.partial_upload_path.unlink(missing_ok=True)
+        self.entry.delete()
+        return HttpResponse(status=204)
+
+
+class DetailView(UserPassesTestMixin, CachedObjectMixin, generic.DetailView):
     model = ReconstructionEntry
     template_name = "detail.html"
     context_object_name = "entry"
@@ -246,46 +549,64 @@ class DetailView(UserPassesTestMixin, generic.DetailView):
     def test_func(self):
         return self.get_object().can_be_seen_by(self.request.user)
 
-    def get_object(self, queryset=None):
-        pk = self.kwargs.get(self.pk_url_kwarg)
-        return get_object_or_404(
-            self.model, pk=pk, is_active=True, process_status=EntryStatus.SUCCESS
+    def get_queryset(self):
+        return self.model.objects.filter(
+            is_active=True, process_status=EntryStatus.SUCCESS
         )
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         entry = self.get_object()
         context = super().get_context_data(**kwargs)
-        subpaths = sorted(
-            Path(s.file.path).relative_to(entry.sample_directory.resolve())
-            for s in entry.samples.all()
+        samples = entry.samples.order_by("subpath").values_list(
+            "subpath", "width", "height"
         )
         context["image_paths"] = [
             (
-                SAMPLE_FRAMES_DIRECTORY
-                / self.model.PREFIX
-                / subpath.with_suffix(".webp"),
+                # Ground truth previews are static files, resolved to their hashed name
+                str(
+                    SAMPLE_FRAMES_DIRECTORY
+                    / self.model.PREFIX
+                    / Path(subpath).with_suffix(".webp")
+                ),
                 entry.sample_directory.relative_to(MEDIA_DIRECTORY) / subpath,
+                width,
+                height,
             )
-            for subpath in subpaths
+            for subpath, width, height in samples
         ]
 
-        # Find prev/next visible submissions for keyboard navigation
-        entries = get_visible_entries(self.request, self.model)
-        prev_entry = (
-            entries.filter(pk__lt=entry.pk).order_by("-pk").first()
-            or entries.order_by("-pk").first()
-        )
-        next_entry = (
-            entries.filter(pk__gt=entry.pk).order_by("pk").first()
-            or entries.order_by("pk").first()
+        # Find prev/next visible submissions for keyboard navigation, in leaderboard
+        # order if we came from there, else by pk, wrapping around at either end
+        order_by = "pk"
+        if sortby := self.request.GET.get("sortby"):
+            *_, order_by = get_sort_order(sortby, self.model)
+            context["sortby"] = sortby
+        context["prev_entry_id"], context["next_entry_id"] = get_neighbours(
+            self.request, entry, order_by
         )
-        context["prev_entry_id"] = prev_entry.pk if prev_entry else None
-        context["next_entry_id"] = next_entry.pk if next_entry else None
 
         return context
 
 
+class AsyncDetailView(DetailView):
+    def dispatch(self, request, *args, **kwargs):
+        # Skip UserPassesTestMixin, its test needs the entry which `get` fetches
+        return super(UserPassesTestMixin, self).dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        self._cached_object = await aget_object_or_404(
+            self.get_queryset(), pk=kwargs["pk"]
+        )
+        if not self.test_func():
+            return self.handle_no_permission()
+
+        self.object = self.get_object()
+        context = await sync_to_async(self.get_context_data)(object=self.object)
+        return self.render_to_response(context)
+
+
 class CompareView(View):
     model = ReconstructionEntry
     template_name = "compare.html"
@@ -293,22 +614,23 @@ class CompareView(View):
     def dispatch(self, request, *args, pk1=None, pk2=None, **kwargs):
         # Directly do UserPassesTestMixin check here instead of
         # inheriting from mixin in order to pass the pks around
+        if not COMPARES.hit(request):
+            return COMPARES.too_many_requests(request)
+
         if pk1 is None and pk2 is None:
-            try:
-                # Select random pks and redirect
-                entries = get_visible_entries(request, self.model)
-                pk1, pk2 = random.sample([entry.pk for entry in entries], 2)
-                return redirect("eval:compare", pk1=pk1, pk2=pk2)
-            except ValueError:
-                # If there's not enough entries, redirect to leaderboard
-                return redirect("eval:reconstruction")
-
-        entry_1 = get_object_or_404(
-            self.model, pk=pk1, is_active=True, process_status=EntryStatus.SUCCESS
-        )
-        entry_2 = get_object_or_404(
-            self.model, pk=pk2, is_active=True, process_status=EntryStatus.SUCCESS
-        )
+            # Select random pks and redirect
+            if pair := sample_visible_pair(request, self.model):
+                return redirect("eval:compare", pk1=pair[0], pk2=pair[1])
+            # If there's not enough entries, redirect to leaderboard
+            return redirect("eval:reconstruction")
+
+        # Fetch both entries in one query
+        entries = self.model.objects.filter(
+            is_active=True, process_status=EntryStatus.SUCCESS
+        ).in_bulk([pk1, pk2])
+        if pk1 not in entries or pk2 not in entries:
+            raise Http404("No entry found matching the query")
+        entry_1, entry_2 = entries[pk1], entries[pk2]
 
         if not self.test_func([entry_1, entry_2]):
             # If user cannot see the entries, send them back to the leaderboard
@@ -320,55 +642,100 @@ class CompareView(View):
     def test_func(self, objects):
         return all(obj.can_be_seen_by(self.request.user) for obj in objects)
 
+    @staticmethod
+    def get_common_samples(entry_1, entry_2):
+        # Samples both entries have in common, straight from the database
+        return list(
+            entry_1.samples.filter(subpath__in=entry_2.samples.values("subpath"))
+            .order_by("subpath")
+            .values_list("subpath", "width", "height")
+        )
+
     def get(self, request, entry_1=None, entry_2=None):
         if entry_1 is None or entry_2 is None:
             # This should never happen as we directly pass the entries from dispatch
             return HttpResponse(status=500)
 
+        samples = self.get_common_samples(entry_1, entry_2)
+        context = self.get_context_data(entry_1, entry_2, samples)
+        return render(request, self.template_name, context=context)
+
+    def get_context_data(self, entry_1, entry_2, samples):
         emphasis = [
             m1 > m2 if "↑" in name.verbose_name else m1 <= m2
             for m1, m2, name in zip(
                 entry_1.metrics, entry_2.metrics, entry_1.metric_fields
             )
         ]
-        subpaths = set(
-            Path(s.file.path).relative_to(entry_1.sample_directory.resolve())
-            for s in entry_1.samples.all()
-        ).intersection(
-            Path(s.file.path).relative_to(entry_2.sample_directory.resolve())
-            for s in entry_2.samples.all()
-        )
         image_subpaths = [
             (
                 entry_1.sample_directory.relative_to(MEDIA_DIRECTORY) / subpath,
                 entry_2.sample_directory.relative_to(MEDIA_DIRECTORY) / subpath,
-                SAMPLE_FRAMES_DIRECTORY
-                / self.model.PREFIX
-                / subpath.with_suffix(".webp"),
+                str(
+                    SAMPLE_FRAMES_DIRECTORY
+                    / self.model.PREFIX
+                    / Path(subpath).with_suffix(".webp")
+                ),
+                width,
+                height,
             )
-            for subpath in sorted(list(subpaths))
+            for subpath, width, height in samples
         ]
-        context = {
+        return {
             "entry_1": entry_1,
             "entry_2": entry_2,
             "emphasis": emphasis,
             "image_subpaths": image_subpaths,
         }
-        return render(request, self.template_name, context=context)
 
 
-class EditView(LoginRequiredMixin, UserPassesTestMixin, generic.UpdateView):
+class AsyncCompareView(CompareView):
+    async def dispatch(self, request, *args, pk1=None, pk2=None, **kwargs):
+        request.user = await request.auser()
+        if not COMPARES.hit(request):
+            return COMPARES.too_many_requests(request)
+
+        if pk1 is None and pk2 is None:
+            if pair := await sync_to_async(sample_visible_pair)(request, self.model):
+                return redirect("eval:compare", pk1=pair[0], pk2=pair[1])
+            return redirect("eval:reconstruction")
+
+        entries = await self.model.objects.filter(
+            is_active=True, process_status=EntryStatus.SUCCESS
+        ).ain_bulk([pk1, pk2])
+        if pk1 not in entries or pk2 not in entries:
+            raise Http404("No entry found matching the query")
+        entry_1, entry_2 = entries[pk1], entries[pk2]
+
+        if not self.test_func([entry_1, entry_2]):
+            return redirect("eval:reconstruction")
+        return await super(CompareView, self).dispatch(
+            request, *args, entry_1=entry_1, entry_2=entry_2, **kwargs
+        )
+
+    async def get(self, request, entry_1=None, entry_2=None):
+        if entry_1 is None or entry_2 is None:
+            return HttpResponse(status=500)
+
+        # Not an async query, the generic relation may look up its content type first
+        samples = await sync_to_async(self.get_common_samples)(entry_1, entry_2)
+        context = self.get_context_data(entry_1, entry_2, samples)
+        return TemplateResponse(request, self.template_name, context=context)
+
+
+class EditView(
+    LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, generic.UpdateView
+):
     model = ReconstructionEntry
     form_class = EditResultEntryForm
     template_name = "resultentry_form.html"
 
     def test_func(self):
         obj = self.get_object()
-        return self.request.user == obj.creator
+        return self.request.user.pk == obj.creator_id
 
-    def get_object(self, queryset=None):
-        pk = self.kwargs.get(self.pk_url_kwarg)
-        return get_object_or_404(self.model, pk=pk, is_active=True)
+    def get_queryset(self):
+        return self.model.objects.filter(is_active=True)
 
     def get_success_url(self):
         if self.object.process_status == EntryStatus.SUCCESS:
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "spcwebsite.settings")
+os.environ.setdefault("SPC_ASGI", "True")
 
 application = get_asgi_application()
@@ -0,0 +1,44 @@
+import socket
+import threading
+
+
+def local_addresses():
+    # Allows requests addressed to this machine's IP directly, e.g. health checks
+    try:
+        return [socket.gethostbyname(socket.gethostname())]
+    except OSError:
+        return []
+
+
+class LazyHostList(list):
+    """ALLOWED_HOSTS of which some are computed on first use rather than when the
+    settings are imported, so that a DNS lookup doesn't block every process start
+    (e.g. manage.py commands, which rarely validate a host)."""
+
+    def __init__(self, hosts, resolve):
+        super().__init__(hosts)
+        self.resolve = resolve
+        self.lock = threading.Lock()
+
+    def _resolve(self):
+        if self.resolve is not None:
+            with self.lock:
+                if self.resolve is not None:
+                    super().extend(self.resolve())
+                    self.resolve = None
+
+    def __iter__(self):
+        self._resolve()
+        return super().__iter__()
+
+    def __contains__(self, host):
+        self._resolve()
+        return super().__contains__(host)
+
+    def __getitem__(self, index):
+        self._resolve()
+        return super().__getitem__(index)
+
+    def __len__(self):
+        self._resolve()
+        return super().__len__()
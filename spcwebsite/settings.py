@@ -12,9 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import ast
 import os
-import socket
 from pathlib import Path
 
+from .hosts import LazyHostList, local_addresses
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -24,22 +25,33 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 DEBUG = ast.literal_eval(os.getenv("SPC_DEBUG", "False"))
 
+# Whether the site is served by an ASGI server, set by spcwebsite/asgi.py
+ASGI = ast.literal_eval(os.getenv("SPC_ASGI", "False"))
+
 if DEBUG:
     SECRET_KEY = "django-insecure-6%9mc$%o+uw(o-77+3))k*rzy(6&=+8f%+km_x1(m@f+umrbk9"
 else:
     SECRET_KEY = os.environ["SPC_SECRET_KEY"]
 
-ALLOWED_HOSTS = [
-    "singlephotonchallenge.com",
-    ".cs.wisc.edu",
-    ".localhost",
-    "127.0.0.1",
-    "[::1]",
-] + [socket.gethostbyname(socket.gethostname())]
+# The local address is looked up on first use, not at every process start
+ALLOWED_HOSTS = LazyHostList(
+    [
+        "singlephotonchallenge.com",
+        ".cs.wisc.edu",
+        ".localhost",
+        "127.0.0.1",
+        "[::1]",
+    ],
+    local_addresses,
+)
 
 CSRF_TRUSTED_ORIGINS = ["https://singlephotonchallenge.com"]
 CSRF_COOKIE_SECURE = True
 
+# Requests from these addresses come from Caddy, which forwards the address of
+# the client in X-Forwarded-For, see core/quotas.py
+TRUSTED_PROXIES = ["127.0.0.1", "::1"]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -57,12 +69,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.ReadOnlyRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.QueryStatsMiddleware",
 ]
 
 ROOT_URLCONF = "spcwebsite.urls"
@@ -90,18 +104,77 @@ WSGI_APPLICATION = "spcwebsite.wsgi.application"
 
 DATABASE_DIR = Path(os.environ["SPC_DATABASEDIR"])
 DATABASE_DIR.mkdir(parents=True, exist_ok=True)
+# Tuned for many concurrent readers and one writer at a time (the evaluator). WAL
+# lets readers proceed while a write is in progress, which only needs to be synced
+# at checkpoints. Writers wait up to 20s for the write lock instead of failing.
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=wal",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=20000",
+    "PRAGMA cache_size=-32000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
+
+# Under ASGI every request runs its queries in a new thread, whose connections can't
+# be reused by later requests, so these are closed at the end of the request instead
+CONN_MAX_AGE = 0 if ASGI else 600
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": DATABASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
         "OPTIONS": {
-            "init_command": "PRAGMA journal_mode=wal;",
+            "init_command": ";".join(SQLITE_PRAGMAS),
             "transaction_mode": "IMMEDIATE",
         },
-    }
+    },
+    # Same database, used for the reads of GET requests, see core/routers.py
+    "readonly": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": DATABASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(SQLITE_PRAGMAS + ["PRAGMA query_only=1"]),
+            "transaction_mode": "DEFERRED",
+        },
+        "TEST": {"MIRROR": "default"},
+    },
+}
+DATABASE_ROUTERS = ["core.routers.ReadOnlyRouter"]
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Per-request query count and database time, set to WARNING to silence
+        "core.middleware": {
+            "handlers": ["console"],
+            "level": os.getenv("SPC_QUERY_LOG_LEVEL", "INFO"),
+        },
+    },
 }
 
 
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+
+# Sessions live in signed cookies instead of the database, see core/sessions.py.
+# These can't be revoked server side, but only hold the user's id and a hash of
+# their password, so changing the password still logs out every other session.
+SESSION_ENGINE = "core.sessions"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -142,9 +215,43 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic writes content-hashed copies of static files, which can be cached
+# forever, and gzip/brotli variants that Caddy serves precompressed
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "core.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 MEDIA_URL = "media/"
 MEDIA_ROOT = os.environ["SPC_IMGDIR"]
 
+# Lifetime, in seconds, of the signed media urls rendered into result pages.
+# These are checked without a database lookup, so an entry that is made private
+# may remain visible to someone who already loaded its page for up to twice this.
+SIGNED_MEDIA_TTL = 60 * 60
+
+# Local to each process, holds the rate limit counters of core/quotas.py
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Benchmarks make many more requests from one client than the rate limits allow
+RATE_LIMITS_ENABLED = ast.literal_eval(os.getenv("SPC_RATE_LIMITS", "True"))
+
+# Submissions are streamed straight into the upload directory, see eval/uploads.py
+FILE_UPLOAD_HANDLERS = [
+    "eval.uploads.SubmissionUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -165,12 +272,12 @@ LOGOUT_REDIRECT_URL = "/"
 RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")
 
 if RESEND_API_KEY:
-    EMAIL_BACKEND = "anymail.backends.resend.EmailBackend"
+    OUTBOX_EMAIL_BACKEND = "anymail.backends.resend.EmailBackend"
     ANYMAIL = {
         "RESEND_API_KEY": RESEND_API_KEY,
     }
 else:
-    EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
     EMAIL_HOST_USER = os.getenv("SPC_EMAILUSER", "")
     EMAIL_HOST_PASSWORD = os.getenv("SPC_EMAILPASSWORD", "")
     EMAIL_HOST = os.getenv("SPC_EMAILHOST", "")
@@ -178,3 +285,18 @@ else:
     EMAIL_USE_TLS = True
 
 DEFAULT_FROM_EMAIL = os.getenv("SPC_FROMEMAIL", "")
+
+# Emails are queued in the database, so that requests don't wait on the mail
+# provider, and sent through OUTBOX_EMAIL_BACKEND by `manage.py send_outbox`.
+# See core/mail.py
+EMAIL_BACKEND = "core.mail.OutboxBackend"
+OUTBOX_EMAIL_BACKEND = os.getenv("SPC_EMAIL_BACKEND", OUTBOX_EMAIL_BACKEND)
+
+# A failed email is retried after OUTBOX_RETRY_SECONDS, doubling the delay after
+# every attempt, up to OUTBOX_MAX_ATTEMPTS attempts (about 2 hours in total)
+OUTBOX_RETRY_SECONDS = 30
+OUTBOX_MAX_ATTEMPTS = 8
+
+# An email with the same sender, recipients and subject as one queued less than
+# this many seconds ago replaces it, or is dropped if that one was already sent
+OUTBOX_DEDUP_SECONDS = 5 * 60
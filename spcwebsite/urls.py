@@ -21,33 +21,41 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
-from core.views import forward_auth_check
+from core.views import (
+    AsyncTemplateView,
+    aforward_auth_check,
+    forward_auth_check,
+    server_view,
+)
+
+# The read-only pages have async variants for when served by ASGI
+PageView = server_view(TemplateView, AsyncTemplateView)
 
 urlpatterns = [
-    path("", TemplateView.as_view(template_name="index.html"), name="index"),
+    path("", PageView.as_view(template_name="index.html"), name="index"),
     path("accounts/", include("core.urls")),
     path("eval/", include("eval.urls")),
     path("admin/", admin.site.urls),
     path("admin/action-forms/", include("django_admin_action_forms.urls")),
     path(
         "download",
-        TemplateView.as_view(template_name="download.html"),
+        PageView.as_view(template_name="download.html"),
         name="download",
     ),
     path(
         "faq",
-        TemplateView.as_view(template_name="faq.html"),
+        PageView.as_view(template_name="faq.html"),
         name="faq",
     ),
     path(
         "competition",
-        TemplateView.as_view(template_name="competition.html"),
+        PageView.as_view(template_name="competition.html"),
         name="competition",
     ),
     path("captcha/", include("captcha.urls")),
     path(
         "auth/check/<str:entry_type>/<int:user_pk>/<uuid:entry_uuid>/<path:path>",
-        forward_auth_check,
+        server_view(forward_auth_check, aforward_auth_check),
         name="auth-check",
     ),
 ]